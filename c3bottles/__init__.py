@@ -48,7 +48,12 @@ language_list = sorted(
 def get_locale():
     """
     Get the locale from the session. If no locale is available, set it.
+    A language given as part of the URL takes precedence, so responses
+    for a URL do not depend on the session.
     """
+    if request and request.view_args and \
+            request.view_args.get("lang") in language_list:
+        return request.view_args["lang"]
     if "lang" not in session or session["lang"] not in language_list:
         set_locale()
     return session["lang"]
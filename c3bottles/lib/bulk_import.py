@@ -0,0 +1,258 @@
+import csv
+import json
+import os
+from datetime import datetime
+from io import StringIO
+
+import click
+from flask_babel import lazy_gettext
+
+from c3bottles import db
+from c3bottles.model.category import all_categories
+from c3bottles.model.drop_point import DropPoint, drop_point_management
+from c3bottles.model.drop_point_change import DropPointChange
+from c3bottles.model.drop_point_state import DropPointState, timestamp
+from c3bottles.model.location import Location
+from c3bottles.model.report import Report
+
+
+formats = ("csv", "geojson")
+
+batch_size = 500
+"""
+The number of drop points looked up at once after inserting them.
+"""
+
+
+def read_rows(data, fmt):
+    """
+    Read drop points to import from a CSV or GeoJSON file.
+
+    A CSV file needs a header with the columns `number`, `lat`, `lng` and
+    `level` and may have the columns `category_id` and `description`. A
+    GeoJSON file has to be a FeatureCollection of points with the same
+    properties (except for the coordinates).
+
+    :param data: the content of the file as str or bytes
+    :param fmt: the format of the file, either "csv" or "geojson"
+    :return: a list of tuples of the row or feature number in the file and
+        a dict of the drop point to import
+    :raises ValueError: If the file cannot be read at all. The error
+        message will contain a dict which indicates the problem.
+    """
+    if isinstance(data, bytes):
+        try:
+            data = data.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise ValueError({"file": lazy_gettext("The file is not UTF-8 encoded.")})
+
+    if fmt == "csv":
+        reader = csv.DictReader(StringIO(data))
+        if reader.fieldnames is None or "number" not in reader.fieldnames:
+            raise ValueError({"file": lazy_gettext("The CSV file has no number column.")})
+        return [(reader.line_num, dict(row)) for row in reader]
+
+    if fmt == "geojson":
+        try:
+            features = json.loads(data)["features"]
+            rows = []
+            for i, feature in enumerate(features, 1):
+                row = dict(feature.get("properties") or {})
+                geometry = feature.get("geometry") or {}
+                if geometry.get("type") == "Point":
+                    row["lng"], row["lat"] = geometry["coordinates"][:2]
+                rows.append((i, row))
+            return rows
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise ValueError({"file": lazy_gettext("The file is no GeoJSON FeatureCollection.")})
+
+    raise ValueError({"format": lazy_gettext("Unknown file format.")})
+
+
+def guess_format(filename):
+    """
+    Guess the format of a file to import from its name.
+
+    :return: "geojson" for files ending with .geojson or .json and "csv"
+        for all other files
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    return "geojson" if ext in (".geojson", ".json") else "csv"
+
+
+def import_drop_points(rows):
+    """
+    Create many drop points at once.
+
+    All rows are validated in memory against the numbers of the existing
+    drop points, which are fetched by a single query, and the numbers of
+    the other rows. Only if all rows are valid, the drop points, their
+    locations, their current states and the change log entries are added
+    with one bulk insert each. The caller has to commit the session.
+
+    :param rows: a list of tuples of the row number and a dict with the
+        keys `number`, `category_id`, `description`, `lat`, `lng` and
+        `level` as returned by :func:`read_rows()`
+    :return: the number of drop points created
+    :raises ValueError: If any row is invalid. The error message will
+        contain a dict for every invalid row which maps the row number to
+        a list of dicts indicating which parameter is invalid, like the
+        errors raised by :class:`DropPoint`.
+    """
+    existing = {n for (n,) in db.session.query(DropPoint.number)}
+    errors = []
+    valid = []
+
+    for row_number, row in rows:
+        dp, row_errors = _validate(row, existing)
+        if row_errors:
+            errors.append({row_number: row_errors})
+        else:
+            existing.add(dp["number"])
+            valid.append(dp)
+
+    if errors:
+        raise ValueError(*errors)
+
+    if not valid:
+        return 0
+
+    now = datetime.today()
+
+    db.session.bulk_insert_mappings(DropPoint, [{
+        "number": dp["number"],
+        "category_id": dp["category_id"],
+        "time": now,
+    } for dp in valid])
+
+    db.session.bulk_insert_mappings(Location, [{
+        "dp_id": dp["number"],
+        "time": now,
+        "description": dp["description"],
+        "lat": dp["lat"],
+        "lng": dp["lng"],
+        "level": dp["level"],
+    } for dp in valid])
+
+    loc_ids = {}
+    numbers = [dp["number"] for dp in valid]
+    for i in range(0, len(numbers), batch_size):
+        loc_ids.update(db.session.query(Location.dp_id, Location.loc_id).filter(
+            Location.dp_id.in_(numbers[i:i + batch_size])
+        ))
+
+    db.session.bulk_insert_mappings(DropPointState, [{
+        "dp_id": dp["number"],
+        "loc_id": loc_ids[dp["number"]],
+        "location_time": now,
+        "description": dp["description"],
+        "lat": dp["lat"],
+        "lng": dp["lng"],
+        "level": dp["level"],
+        "last_state": Report.states[1],
+        "total_report_count": 0,
+        "new_report_count": 0,
+        "report_weight_sum": 0.0,
+        "priority_base": timestamp(now),
+    } for dp in valid])
+
+    # Bulk inserts bypass the flush events logging changes.
+    DropPointChange.lock(db.session)
+    db.session.bulk_insert_mappings(DropPointChange, [
+        {"dp_id": n, "time": now} for n in sorted(numbers)
+    ])
+    db.session.info["dp_changed"] = True
+
+    return len(valid)
+
+
+def error_messages(errors):
+    """
+    Get readable messages for the errors raised by :func:`read_rows()` or
+    :func:`import_drop_points()`.
+
+    :param errors: the arguments of the ValueError raised
+    :return: a generator of messages
+    """
+    for error in errors:
+        for key, value in error.items():
+            if isinstance(value, list):
+                for row_error in value:
+                    for field, message in row_error.items():
+                        yield lazy_gettext(
+                            "Row %(row)s (%(field)s): %(message)s",
+                            row=key, field=field, message=message
+                        )
+            else:
+                yield value
+
+
+def _validate(row, existing):
+    errors = []
+    dp = {}
+
+    def value(key):
+        v = row.get(key)
+        return v.strip() if isinstance(v, str) else v
+
+    try:
+        dp["number"] = int(value("number"))
+    except (TypeError, ValueError):
+        errors.append({"number": lazy_gettext("Drop point number is not a number.")})
+    else:
+        if dp["number"] < 1:
+            errors.append({"number": lazy_gettext("Drop point number is not positive.")})
+        elif dp["number"] in existing:
+            errors.append({"number": lazy_gettext("That drop point already exists.")})
+
+    category_id = value("category_id")
+    try:
+        dp["category_id"] = int(category_id) if category_id not in (None, "") else 0
+    except (TypeError, ValueError):
+        dp["category_id"] = None
+    if dp["category_id"] not in all_categories:
+        errors.append({"cat_id": lazy_gettext("Invalid drop point category.")})
+
+    try:
+        dp["lat"] = float(value("lat"))
+    except (TypeError, ValueError):
+        errors.append({"lat": lazy_gettext("Latitude is not a floating point number.")})
+
+    try:
+        dp["lng"] = float(value("lng"))
+    except (TypeError, ValueError):
+        errors.append({"lng": lazy_gettext("Longitude is not a floating point number.")})
+
+    try:
+        dp["level"] = int(value("level"))
+    except (TypeError, ValueError):
+        errors.append({"level": lazy_gettext("Level is not a number.")})
+
+    description = value("description")
+    dp["description"] = str(description) if description not in (None, "") else None
+    if dp["description"] and len(dp["description"]) > Location.max_description:
+        errors.append({"description": lazy_gettext("Location description is too long.")})
+
+    return dp, errors
+
+
+@drop_point_management.command("import")
+@click.argument("file", type=click.File("rb"))
+@click.option("--format", "fmt", type=click.Choice(formats),
+              help="The format of the file (default: guessed from the file name).")
+def import_command(file, fmt):
+    """
+    Imports drop points from a CSV or GeoJSON file.
+
+    Either all drop points in the file are created or none of them if any
+    row is invalid.
+    """
+    try:
+        count = import_drop_points(read_rows(file.read(), fmt or guess_format(file.name)))
+    except ValueError as e:
+        db.session.rollback()
+        for message in error_messages(e.args):
+            click.echo(message, err=True)
+        raise SystemExit(1)
+    db.session.commit()
+    print("{} drop points imported.".format(count))
@@ -0,0 +1,206 @@
+import os
+from tempfile import mkstemp
+from threading import Lock
+from time import time
+
+from c3bottles import app
+from c3bottles.model.drop_point_change import DropPointChange
+
+
+class VersionedCache(object):
+    """
+    An in-process cache for values derived from the drop point data.
+
+    The data version is the cursor of the latest drop point change, so all
+    entries are dropped as soon as any drop point, location, report or
+    visit has been changed by any process. Entries older than
+    `CACHE_MAX_AGE` seconds are created again as well, as some values
+    (e.g. visit priorities) change over time without any change of data.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._entries = {}
+
+    def get(self, key, create, keep=None):
+        """
+        Get an entry from the cache.
+
+        :param key: the key of the entry in the current data version
+        :param create: a function creating the value if it is not cached
+        :param keep: a function telling whether a newly created value
+            should be cached, by default all values are cached
+        :return: the cached or newly created value
+        """
+        version = DropPointChange.get_cursor()
+        max_age = app.config.get("CACHE_MAX_AGE", 60)
+        now = time()
+
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._entries = {}
+            entry = self._entries.get(key)
+
+        if entry is not None and now - entry[0] < max_age:
+            return entry[1]
+
+        value = create()
+
+        if max_age > 0 and (keep is None or keep(value)):
+            with self._lock:
+                if version == self._version:
+                    self._entries[key] = (now, value)
+
+        return value
+
+
+class FragmentCache(object):
+    """
+    An in-process cache for values derived from single drop points.
+
+    Unlike :class:`VersionedCache`, a change of the data version only
+    drops the entries of the drop points changed since the last version
+    seen, so that a single report does not invalidate the values of all
+    other drop points. Entries older than `CACHE_MAX_AGE` seconds are
+    created again as well.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._entries = {}
+
+    def iter_all(self, key, load, create):
+        """
+        Iterate over the entries of many drop points.
+
+        The drop points are loaded only after the data version has been
+        determined, so values created from them are never older than the
+        version they are stored for. As the drop points are consumed one
+        by one, `load` may return an iterator over a query result which
+        is fetched in batches.
+
+        :param key: the key of the entries of the drop points, e.g. the
+            locale the values have been created for
+        :param load: a function returning the drop points to get the
+            entries of
+        :param create: a function creating the value for a drop point if
+            it is not cached
+        :return: a generator of tuples of a drop point and its cached or
+            newly created value
+        """
+        max_age = app.config.get("CACHE_MAX_AGE", 60)
+        now = time()
+
+        with self._lock:
+            self._sync()
+            version = self._version
+
+        created = {}
+        try:
+            for dp in load():
+                with self._lock:
+                    entry = self._entries.get((dp.number, key)) \
+                        if version == self._version else None
+                if entry is not None and now - entry[0] < max_age:
+                    yield dp, entry[1]
+                else:
+                    value = create(dp)
+                    created[(dp.number, key)] = (now, value)
+                    yield dp, value
+        finally:
+            if max_age > 0 and created:
+                with self._lock:
+                    if version == self._version:
+                        self._entries.update(created)
+
+    def _sync(self):
+        version = DropPointChange.get_cursor()
+        if self._version is None or version < self._version:
+            self._entries = {}
+            self._version = version
+        elif version > self._version:
+            numbers, self._version = DropPointChange.since(self._version)
+            numbers = set(numbers)
+            for k in [k for k in self._entries if k[0] in numbers]:
+                del self._entries[k]
+
+
+class DiskCache(object):
+    """
+    A cache of files on disk shared by all processes.
+
+    Entries are never invalidated, so their keys have to identify their
+    content, e.g. by a hash of everything the content is derived from.
+    Whenever the files in the cache directory exceed `max_size` bytes,
+    the least recently used ones are removed.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    def get(self, key):
+        """
+        Get an entry from the cache.
+
+        :param key: the key of the entry, which has to be a valid file name
+        :return: the cached bytes or None if the entry is not cached
+        """
+        if self.max_size <= 0:
+            return None
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return value
+
+    def put(self, key, value):
+        """
+        Store an entry in the cache.
+        """
+        self.put_all([(key, value)])
+
+    def put_all(self, items):
+        """
+        Store several entries in the cache and evict old entries once.
+
+        Every entry is written to a temporary file first and renamed
+        afterwards, so other processes never read an incomplete entry.
+
+        :param items: an iterable of tuples of key and bytes
+        """
+        if self.max_size <= 0:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for key, value in items:
+            fd, tmp = mkstemp(dir=self.directory, prefix=".")
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp, os.path.join(self.directory, key))
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith("."):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(e[1] for e in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
@@ -0,0 +1,151 @@
+from math import floor, log, pi, radians, tan, cos
+
+from flask_babel import lazy_gettext
+
+from c3bottles import app, db
+from c3bottles.lib.cache import VersionedCache
+from c3bottles.model.drop_point import DropPoint, parse_bbox
+from c3bottles.model.drop_point_state import DropPointState
+from c3bottles.model.report import Report
+
+
+cell_size = 64
+"""
+The size of the grid cells drop points are clustered in, in pixels.
+"""
+
+max_zoom = 30
+
+
+def severity(state):
+    """
+    Get the severity of a report state.
+
+    States with a higher report weight are more severe. Between states of
+    the same weight, the one listed later in :attr:`Report.states` wins.
+    """
+    return Report.get_state_weight(state), Report.states.index(state)
+
+
+def project(lat, lng, zoom):
+    """
+    Project a location to pixel coordinates at a zoom level.
+
+    This uses the same coordinate reference system as the map, i.e.
+    `L.CRS.Simple` if the map source uses a simple CRS and the spherical
+    Mercator projection otherwise.
+    """
+    scale = 2 ** zoom
+    if app.config.get("MAP_SOURCE", {}).get("simple_crs", False):
+        return lng * scale, -lat * scale
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    x = (lng + 180.0) / 360.0
+    y = (1.0 - log(tan(radians(lat)) + 1.0 / cos(radians(lat))) / pi) / 2.0
+    return x * 256 * scale, y * 256 * scale
+
+
+def get_clusters(zoom, level=None, bbox=None):
+    """
+    Get the clusters of all active drop points at a zoom level.
+
+    The drop points are grouped in grid cells of :data:`cell_size` pixels
+    at the given zoom level. The clusters of a zoom level and map level
+    are cached per data version, a bounding box only selects the clusters
+    whose center lies within.
+
+    :param zoom: the zoom level of the map
+    :param level: only cluster drop points on this level, which has to be
+        one of the levels of the map if the map source has several
+    :param bbox: a bounding box as accepted by :func:`parse_bbox()`
+    :return: a list of dicts with the center, the number of drop points,
+        the numbers of the drop points, the number of drop points per
+        state and the worst state of each cluster
+    :raises ValueError: If any of the parameters is invalid. The error
+        message will contain a tuple of dicts which indicate which
+        parameter is invalid.
+    """
+
+    errors = []
+
+    try:
+        zoom = int(zoom)
+    except (TypeError, ValueError):
+        errors.append({"zoom": lazy_gettext("Zoom level is not a number.")})
+    else:
+        if not -max_zoom <= zoom <= max_zoom:
+            errors.append({"zoom": lazy_gettext("Zoom level is out of range.")})
+
+    if level is not None:
+        try:
+            level = int(level)
+        except (TypeError, ValueError):
+            errors.append({"level": lazy_gettext("Level is not a number.")})
+        else:
+            level_config = app.config.get("MAP_SOURCE", {}).get("level_config")
+            if level_config and level not in (lvl for (_, lvl) in level_config):
+                errors.append({"level": lazy_gettext("Level does not exist.")})
+
+    if bbox is not None:
+        bbox = parse_bbox(bbox)
+        if bbox is None:
+            errors.append({"bbox": lazy_gettext("Invalid bounding box.")})
+
+    if errors:
+        raise ValueError(*errors)
+
+    # Empty results are not cached, so the cache does not grow with
+    # requests for zoom levels or levels without drop points.
+    clusters = _clusters_cache.get(
+        (zoom, level), lambda: _cluster(zoom, level), keep=bool
+    )
+
+    if bbox is None:
+        return clusters
+
+    west, south, east, north = bbox
+    return [
+        c for c in clusters
+        if south <= c["lat"] <= north and west <= c["lng"] <= east
+    ]
+
+
+def _cluster(zoom, level):
+    query = db.session.query(
+        DropPointState.dp_id,
+        DropPointState.lat,
+        DropPointState.lng,
+        DropPointState.last_state
+    ).join(DropPoint).filter(DropPoint.removed == None)  # noqa
+    if level is not None:
+        query = query.filter(DropPointState.level == level)
+
+    cells = {}
+    for number, lat, lng, state in query.order_by(DropPointState.dp_id):
+        if lat is None or lng is None:
+            continue
+        x, y = project(lat, lng, zoom)
+        cell = cells.setdefault(
+            (floor(x / cell_size), floor(y / cell_size)),
+            {"lat": 0.0, "lng": 0.0, "numbers": [], "states": {}}
+        )
+        cell["lat"] += lat
+        cell["lng"] += lng
+        cell["numbers"].append(number)
+        cell["states"][state] = cell["states"].get(state, 0) + 1
+
+    clusters = []
+    for key in sorted(cells):
+        cell = cells[key]
+        count = len(cell["numbers"])
+        clusters.append({
+            "lat": cell["lat"] / count,
+            "lng": cell["lng"] / count,
+            "count": count,
+            "numbers": cell["numbers"],
+            "states": cell["states"],
+            "worst_state": max(cell["states"], key=severity),
+        })
+    return clusters
+
+
+_clusters_cache = VersionedCache()
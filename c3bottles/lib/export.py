@@ -0,0 +1,242 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import sys
+from tempfile import gettempdir, mkstemp
+from time import time
+
+from flask import request
+from flask_babel import lazy_gettext
+
+from c3bottles import app
+from c3bottles.lib.labels import labels_key, write_pdfs
+from c3bottles.model.drop_point import DropPoint
+
+
+lock_file = ".lock"
+"""
+The file in `LABEL_EXPORT_DIR` locked by the export currently running.
+"""
+
+
+class LabelExport(object):
+    """
+    A job exporting the labels of many drop points into a PDF file.
+
+    Every export is run by a new process started by the one which
+    started the export. Rendering labels takes a lot of CPU time without
+    ever yielding to other greenlets, so a thread of a gevent worker
+    would stall all other requests of that worker. The exports of all processes
+    on the same host are run one after another. The state of every export
+    is kept in a small JSON file next to the PDF in `LABEL_EXPORT_DIR`,
+    so any process on the same host can report the progress and serve the
+    PDF once it is done. Exports are removed after `LABEL_EXPORT_MAX_AGE`
+    seconds.
+
+    The id of an export is the key of the labels it contains (see
+    :func:`labels_key()`), so exporting the same labels again reuses the
+    export as long as it is pending, running or done.
+    """
+
+    states = ("PENDING", "RUNNING", "DONE", "FAILED")
+
+    def __init__(self, job_id, state=None, done=0, total=0, created=None):
+        self.id = job_id
+        self.state = state if state else self.states[0]
+        self.done = done
+        self.total = total
+        self.created = created if created else time()
+
+    @property
+    def path(self):
+        """
+        The path of the PDF file, which is complete if the export is done.
+        """
+        return os.path.join(export_dir(), "{}.pdf".format(self.id))
+
+    @classmethod
+    def start(cls, level=None, category_id=None, first=None, last=None, numbers=None):
+        """
+        Start exporting the labels of all active drop points matching the
+        filters given unless an export of the same labels which has not
+        failed exists already.
+
+        :param level: only export drop points on this level
+        :param category_id: only export drop points of this category
+        :param first: only export drop points with at least this number
+        :param last: only export drop points with at most this number
+        :param numbers: only export these drop points, given as a comma
+            separated string or a sequence of numbers
+        :return: the export started or reused
+        :raises ValueError: If any of the filters is invalid. The error
+            message will contain a tuple of dicts which indicate which
+            parameter is invalid.
+        """
+
+        errors = []
+
+        def parse_number(name, value):
+            if value is None:
+                return None
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                errors.append({name: lazy_gettext("Drop point number is not a number.")})
+
+        first = parse_number("first", first)
+        last = parse_number("last", last)
+
+        try:
+            query = DropPoint.get_dps_query(
+                level=level, category_id=category_id, removed=False, numbers=numbers
+            )
+        except ValueError as e:
+            errors.extend(e.args)
+
+        if errors:
+            raise ValueError(*errors)
+
+        if first is not None:
+            query = query.filter(DropPoint.number >= first)
+        if last is not None:
+            query = query.filter(DropPoint.number <= last)
+        dp_numbers = [n for (n,) in query.with_entities(DropPoint.number)]
+
+        _remove_expired()
+
+        job_id = labels_key(dp_numbers)
+        job = cls.get(job_id)
+        if job is not None and (job.state in cls.states[:2] or
+                                job.state == cls.states[2] and os.path.exists(job.path)):
+            return job
+
+        job = cls(job_id, total=len(dp_numbers))
+        job.save()
+        # Reap the processes of finished exports.
+        multiprocessing.active_children()
+        _context().Process(
+            target=_run, args=(job, request.url_root, dp_numbers, _label_config())
+        ).start()
+        return job
+
+    @classmethod
+    def get(cls, job_id):
+        """
+        Get an export by its id.
+
+        :return: the export or None if there is no such export
+        """
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(export_dir(), "{}.json".format(job_id))) as f:
+                return cls(job_id, **json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def run(self, url_root, numbers):
+        """
+        Export the labels of the drop points given.
+
+        This waits until no other export is running on the same host.
+        """
+
+        saved = [0]
+
+        def progress(done, total):
+            # Saving the state once a second is enough for polling clients.
+            self.done = done
+            if time() - saved[0] >= 1:
+                self.save()
+                saved[0] = time()
+
+        # A record lock belongs to this process only, so it is not held by
+        # the processes rendering the labels and is released for sure once
+        # this process exits.
+        lock_fd = os.open(
+            os.path.join(export_dir(), lock_file), os.O_WRONLY | os.O_CREAT | os.O_CLOEXEC
+        )
+        with os.fdopen(lock_fd, "w") as lock:
+            fcntl.lockf(lock, fcntl.LOCK_EX)
+            self.state = self.states[1]
+            self.save()
+            try:
+                with app.test_request_context(base_url=url_root):
+                    fd, tmp = mkstemp(dir=export_dir(), prefix=".")
+                    with os.fdopen(fd, "wb") as f:
+                        write_pdfs(numbers, f, progress)
+                    os.replace(tmp, self.path)
+            except Exception:  # noqa
+                app.logger.exception("Label export %s failed.", self.id)
+                self.state = self.states[3]
+            else:
+                self.state = self.states[2]
+                self.done = self.total
+            self.save()
+
+    def save(self):
+        """
+        Write the state of the export for all processes to see.
+        """
+        fd, tmp = mkstemp(dir=export_dir(), prefix=".")
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "state": self.state,
+                "done": self.done,
+                "total": self.total,
+                "created": self.created,
+            }, f)
+        os.replace(tmp, os.path.join(export_dir(), "{}.json".format(self.id)))
+
+    def __repr__(self):
+        return "Label export %s (%s, %s of %s)" % (
+            self.id, self.state, self.done, self.total
+        )
+
+
+def export_dir():
+    """
+    Get the directory label exports are written to, creating it if needed.
+    """
+    directory = app.config.get(
+        "LABEL_EXPORT_DIR", os.path.join(gettempdir(), "c3bottles-exports")
+    )
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _remove_expired():
+    max_age = app.config.get("LABEL_EXPORT_MAX_AGE", 24 * 60 * 60)
+    now = time()
+    for entry in os.scandir(export_dir()):
+        if entry.name == lock_file:
+            continue
+        try:
+            if now - entry.stat().st_mtime > max_age:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _context():
+    # A process forked from a gevent worker would inherit its hub and its
+    # patched threading, which the pool rendering the labels relies on, so
+    # exports are started in a fresh interpreter then. Other servers (e.g.
+    # mod_wsgi or uWSGI) may not run Python as their executable, so exports
+    # are forked there.
+    if "gevent" in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched("threading"):
+            return multiprocessing.get_context("spawn")
+    return multiprocessing.get_context("fork")
+
+
+def _label_config():
+    return {k: v for k, v in app.config.items() if k.startswith("LABEL_")}
+
+
+def _run(job, url_root, numbers, config):
+    # A fresh interpreter only knows the configuration file.
+    app.config.update(config)
+    job.run(url_root, numbers)
@@ -0,0 +1,349 @@
+import os
+from base64 import b64encode
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+from multiprocessing import get_context
+from tempfile import gettempdir
+
+import click
+import qrcode
+from flask import render_template, request
+from jinja2 import meta
+
+from c3bottles import app
+from c3bottles.lib.cache import DiskCache
+from c3bottles.model.drop_point import DropPoint
+
+
+qr_border = 4
+"""
+The width of the quiet zone around QR codes in modules.
+"""
+
+svg_batch_size = 64
+"""
+The number of rendered SVGs stored in the label cache at once.
+"""
+
+
+def label_key(number, template=None):
+    """
+    Get the key of the label of a drop point in the label cache.
+
+    A label depends only on the number of the drop point, the root URL
+    of the current request and the SVG template selected by
+    `LABEL_STYLE`, so the key is a hash of these. As the key changes
+    whenever the label does, it is used as ETag of the label as well.
+
+    :param template: the digest of the template as returned by
+        :func:`template_digest()`, which is looked up if not given
+    """
+    if template is None:
+        template = template_digest()
+    return _digest("label", number, request.url_root, template)
+
+
+def labels_key(numbers, template=None):
+    """
+    Get the key of a PDF with the labels of several drop points.
+    """
+    if template is None:
+        template = template_digest()
+    return _digest("labels", *(label_key(n, template) for n in numbers))
+
+
+def svg_key(number, template=None):
+    """
+    Get the key of the SVG of the label of a drop point in the label cache.
+
+    The SVG changes exactly when the label does, so its key is derived
+    from :func:`label_key()`.
+    """
+    return _digest("svg", label_key(number, template))
+
+
+def template_digest():
+    """
+    Get a hash of the name and the content of the label template.
+    """
+    name = "label/{}.svg".format(app.config.get("LABEL_STYLE", "default"))
+    source = app.jinja_loader.get_source(app.jinja_env, name)[0]
+    return _digest(name, source)
+
+
+def label_cache():
+    """
+    Get the cache of rendered labels.
+
+    The labels are kept in `LABEL_CACHE_DIR` until they take up more than
+    `LABEL_CACHE_SIZE` bytes. A size of 0 disables the cache.
+    """
+    return DiskCache(
+        app.config.get("LABEL_CACHE_DIR", os.path.join(gettempdir(), "c3bottles-labels")),
+        app.config.get("LABEL_CACHE_SIZE", 256 * 1024 * 1024)
+    )
+
+
+def create_pdf(number):
+    """
+    Get the label of a drop point as a single page PDF.
+
+    Labels are taken from the label cache if possible and stored there
+    after rendering otherwise. Either way, the label is drawn from its
+    cached SVG (see :func:`create_svgs()`).
+
+    :return: the PDF as bytes
+    """
+    cache = label_cache()
+    key = label_key(number)
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render_pdf(number)
+        cache.put(key, pdf)
+    return pdf
+
+
+def render_pdf(number):
+    """
+    Render the label of a drop point as a single page PDF.
+
+    :return: the PDF as bytes
+    """
+    f = BytesIO()
+    render_pdfs([number], f)
+    return f.getvalue()
+
+
+def render_pdfs(numbers, f, progress=None):
+    """
+    Render the labels of several drop points into one PDF in one pass.
+
+    Every label is drawn on its own page of a single cairo PDF surface
+    which writes the pages to the file as they are finished, so no PDF
+    has to be parsed or merged and only one label is kept in memory. The
+    SVGs of the labels are taken from the label cache by
+    :func:`create_svgs()`, so only labels which changed are rendered from
+    their template again.
+
+    :param numbers: the numbers of the drop points
+    :param f: a binary file to write the PDF to
+    :param progress: a function called with the number of labels done
+        whenever a label has been rendered
+    """
+    # cairocffi loads libcairo on import, so only processes rendering
+    # labels need it.
+    from cairosvg.parser import Tree
+    from cairosvg.surface import PDFSurface, cairo
+
+    class PageSurface(PDFSurface):
+        """
+        A surface drawing on the current page of a shared PDF surface
+        instead of creating a new PDF.
+        """
+
+        def _create_surface(self, width, height):
+            self.output.set_size(width, height)
+            return self.output, width, height
+
+        def draw_root(self, node):
+            # Nested SVG elements (e.g. the QR code) are not pages here.
+            self.draw(node)
+
+    pdf = cairo.PDFSurface(f, 1, 1)
+    for i, svg in enumerate(create_svgs(numbers)):
+        if i:
+            pdf.show_page()
+        PageSurface(Tree(bytestring=svg), pdf, 96)
+        if progress:
+            progress(i + 1)
+    pdf.finish()
+
+
+def create_svgs(numbers):
+    """
+    Get the SVGs of the labels of several drop points.
+
+    The SVGs are taken from the label cache if possible. The ones missing
+    are rendered and stored in the cache in batches of
+    :data:`svg_batch_size`, so the cache is not trimmed after every label.
+
+    :param numbers: the numbers of the drop points
+    :return: an iterator of the SVGs as bytes in the order of the numbers
+    """
+    cache = label_cache()
+    template = template_digest()
+    png = _template_uses_png()
+    rendered = []
+    try:
+        for number in numbers:
+            key = svg_key(number, template)
+            svg = cache.get(key)
+            if svg is None:
+                svg = render_svg(number, png).encode("utf-8")
+                rendered.append((key, svg))
+                if len(rendered) >= svg_batch_size:
+                    cache.put_all(rendered)
+                    rendered = []
+            yield svg
+    finally:
+        cache.put_all(rendered)
+
+
+def render_svg(number, png=False):
+    """
+    Render the SVG of the label of a drop point.
+
+    The label links to the drop point below the root URL of the current
+    request and uses the SVG template selected by `LABEL_STYLE`. The QR
+    code is passed to the template as SVG path (`qr_path`) of a square
+    of `qr_size` units. Templates still embedding the QR code as PNG
+    image get it Base64 encoded as `qr` if `png` is set.
+    """
+    qr = qrcode.QRCode(border=qr_border)
+    qr.add_data(request.url_root + str(number))
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+
+    b64 = None
+    if png:
+        f = BytesIO()
+        qr.make_image().save(f)
+        b64 = b64encode(f.getvalue()).decode("utf-8")
+
+    label_style = app.config.get("LABEL_STYLE", "default")
+    return render_template(
+        "label/{}.svg".format(label_style),
+        number=number,
+        qr=b64,
+        qr_path=qr_path(matrix),
+        qr_size=len(matrix)
+    )
+
+
+def qr_path(matrix):
+    """
+    Get the SVG path data drawing the dark modules of a QR code.
+
+    Every row of adjacent dark modules is drawn as a single rectangle of
+    one unit height.
+
+    :param matrix: the modules of the QR code as a list of rows of bools
+    """
+    d = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                d.append("M{},{}h{}v1h-{}z".format(start, y, x - start, x - start))
+            else:
+                x += 1
+    return "".join(d)
+
+
+def _template_uses_png():
+    name = "label/{}.svg".format(app.config.get("LABEL_STYLE", "default"))
+    source = app.jinja_loader.get_source(app.jinja_env, name)[0]
+    return "qr" in meta.find_undeclared_variables(app.jinja_env.parse(source))
+
+
+def create_pdfs(numbers):
+    """
+    Get the labels of several drop points as one PDF.
+
+    The PDF is drawn by :func:`render_pdfs()` in one pass from the SVGs
+    in the label cache, so adding or removing a drop point only renders
+    the SVG of its own label again.
+
+    :param numbers: the numbers of the drop points
+    :return: the PDF as bytes
+    """
+    f = BytesIO()
+    render_pdfs(numbers, f)
+    return f.getvalue()
+
+
+def write_pdfs(numbers, f, progress=None):
+    """
+    Write the labels of several drop points as one PDF to a file.
+
+    This is meant for label exports, which run in a process of their own.
+    All labels are drawn by :func:`render_pdfs()` in one pass straight
+    into the file, so no page is kept in memory. With `LABEL_WORKERS` set
+    to more than 1, the SVGs missing in the label cache are rendered in
+    parallel by a pool of that many processes beforehand, each of them
+    taking two consecutive chunks of the numbers.
+
+    :param numbers: the numbers of the drop points
+    :param f: a binary file to write the PDF to
+    :param progress: a function called with the number of labels done
+        and the total number of labels whenever a label has been drawn
+    """
+    numbers = list(numbers)
+    total = len(numbers)
+    workers = _workers()
+
+    if workers > 1 and total > 1 and label_cache().max_size > 0:
+        # Two chunks per worker keep all workers busy until the end.
+        size = max(1, -(-total // (workers * 2)))
+        chunks = [numbers[i:i + size] for i in range(0, total, size)]
+        # The pool only lives as long as this call, so no worker process
+        # is left behind once the SVGs have been rendered.
+        with ProcessPoolExecutor(workers, mp_context=get_context("fork")) as pool:
+            for _ in pool.map(_render, [request.url_root] * len(chunks), chunks):
+                pass
+
+    render_pdfs(numbers, f, progress and (lambda done: progress(done, total)))
+
+
+def _render(url_root, numbers):
+    with app.test_request_context(base_url=url_root):
+        for _ in create_svgs(numbers):
+            pass
+
+
+def _digest(*parts):
+    h = sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _workers():
+    return max(1, int(app.config.get("LABEL_WORKERS", 1)))
+
+
+@app.cli.group("label")
+def label_management():
+    """
+    Label management.
+
+    These commands allow maintenance of the drop point labels.
+    """
+
+
+@label_management.command("prewarm")
+@click.argument("url_root")
+def prewarm_labels(url_root):
+    """
+    Renders the labels of all active drop points into the label cache.
+
+    Every label is rendered once as SVG, which all PDFs containing the
+    label are drawn from.
+
+    The labels link to the drop points below URL_ROOT, which has to be
+    the root URL c3bottles is served at, e.g. https://example.org/.
+    """
+    if not url_root.endswith("/"):
+        url_root += "/"
+    with app.test_request_context(base_url=url_root):
+        numbers = [number for (number,) in DropPoint.query.filter(
+            DropPoint.removed == None  # noqa
+        ).order_by(DropPoint.number).with_entities(DropPoint.number)]
+        for _ in create_svgs(numbers):
+            pass
+    print("Labels of {} drop points cached.".format(len(numbers)))
@@ -1,54 +1,163 @@
-from prometheus_client import Counter, Histogram, start_http_server, Gauge
+import os
+import re
+from collections import Counter as Tally
+from functools import partial
 from time import time
+from wsgiref.simple_server import make_server, WSGIRequestHandler
 
-from flask import request
+from flask import g, has_request_context, request
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, \
+    make_wsgi_app, multiprocess, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 from c3bottles import app
 from c3bottles.lib.statistics import stats_obj
 
 
-drop_point_count = Gauge(
-    "c3bottles_drop_point_count", "c3bottles total nmumber of drop points"
+request_latency = Histogram(
+    "c3bottles_request_latency_seconds", "c3bottles Request Latency", ["method", "endpoint"]
 )
 
-drop_point_count.set_function(lambda: stats_obj.drop_point_count)
-
-report_count = Gauge(
-    "c3bottles_report_count", "c3bottles total number of reports"
+request_count = Counter(
+    "c3bottles_request_count", "c3bottles Request Count", ["method", "endpoint", "http_status"]
 )
 
-report_count.set_function(lambda: stats_obj.report_count)
+request_db_queries = Histogram(
+    "c3bottles_request_db_queries", "c3bottles SQL Queries per Request", ["method", "endpoint"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf"))
+)
 
-visit_count = Gauge(
-    "c3bottles_visit_count", "c3bottles total number of visits"
+request_db_latency = Histogram(
+    "c3bottles_request_db_seconds", "c3bottles SQL Time per Request", ["method", "endpoint"]
 )
 
-visit_count.set_function(lambda: stats_obj.visit_count)
 
-request_latency = Histogram(
-    "c3bottles_request_latency_seconds", "c3bottles Request Latency", ["method", "endpoint"]
-)
+class StatisticsCollector(object):
+    """
+    A collector for the gauges backed by the database.
 
-request_count = Counter(
-    "c3bottles_request_count", "c3bottles Request Count", ["method", "endpoint", "http_status"]
-)
+    The numbers are taken from the statistics once per scrape by the
+    process serving the metrics only, not by every worker process.
+    """
+
+    def collect(self):
+        yield GaugeMetricFamily(
+            "c3bottles_drop_point_count", "c3bottles total nmumber of drop points",
+            value=stats_obj.drop_point_count
+        )
+        yield GaugeMetricFamily(
+            "c3bottles_report_count", "c3bottles total number of reports",
+            value=stats_obj.report_count
+        )
+        yield GaugeMetricFamily(
+            "c3bottles_visit_count", "c3bottles total number of visits",
+            value=stats_obj.visit_count
+        )
+
+
+def fingerprint(statement):
+    """
+    Reduce an SQL statement to a fingerprint identifying similar queries.
+
+    Literals are replaced by placeholders and lists of placeholders (e.g.
+    in `IN` clauses) are collapsed, so the same query with different
+    parameters has the same fingerprint.
+    """
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    statement = re.sub(r"\b\d+(?:\.\d+)?\b", "?", statement)
+    statement = re.sub(r"%\(\w+\)s|:\w+|%s", "?", statement)
+    statement = re.sub(r"\?(?:\s*,\s*\?)+", "?", statement)
+    return " ".join(statement.split())
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info["query_start"].pop()
+    if has_request_context() and hasattr(g, "sql_queries"):
+        g.sql_queries.append((statement, time() - start))
 
 
 def before_request():
     request.start_time = time()
+    g.sql_queries = []
 
 
 def after_request(response):
-    latency = time() - request.start_time
-    request_latency.labels(request.method, request.endpoint).observe(latency)
-    request_count.labels(request.method, request.endpoint, response.status_code).inc()
+    """
+    Record the metrics of a request once its response has been sent.
+
+    The body of streamed responses is generated after this has been
+    called, so the latency and the SQL queries are only recorded when the
+    response is closed.
+    """
+    response.call_on_close(partial(
+        _record, request.method, request.endpoint, request.path,
+        response.status_code, request.start_time, getattr(g, "sql_queries", [])
+    ))
     return response
 
 
+def _record(method, endpoint, path, status, start_time, queries):
+    request_latency.labels(method, endpoint).observe(time() - start_time)
+    request_count.labels(method, endpoint, status).inc()
+
+    request_db_queries.labels(method, endpoint).observe(len(queries))
+    request_db_latency.labels(method, endpoint).observe(sum(t for _, t in queries))
+
+    budget = app.config.get("SQL_QUERY_BUDGET", 50)
+    if budget and len(queries) > budget:
+        app.logger.warning(
+            "%s %s issued %d SQL queries (budget %d):\n%s",
+            method, path, len(queries), budget,
+            "\n".join(
+                "{:5d}x {}".format(n, f)
+                for f, n in Tally(fingerprint(s) for s, _ in queries).most_common()
+            )
+        )
+
+
+def is_multiprocess():
+    """
+    Check if the metrics of several worker processes are collected in a
+    shared directory, i.e. if `prometheus_multiproc_dir` is set.
+    """
+    return bool(os.environ.get("prometheus_multiproc_dir"))
+
+
 def monitor(app,
             address=app.config.get("PROMETHEUS_ADDRESS", "127.0.0.1"),
             port=app.config.get("PROMETHEUS_PORT", 9567)):
     app.before_request(before_request)
     app.after_request(after_request)
+    if is_multiprocess():
+        # The metrics of all workers are served by `./manage.py metrics`,
+        # which is started by the Gunicorn configuration.
+        return
+    REGISTRY.register(StatisticsCollector())
     start_http_server(port, address)
     print("Prometheus exporter started on http://{}:{}/".format(address, port))
+
+
+def serve(address=app.config.get("PROMETHEUS_ADDRESS", "127.0.0.1"),
+          port=app.config.get("PROMETHEUS_PORT", 9567)):
+    """
+    Serve the metrics of all worker processes until interrupted.
+    """
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(StatisticsCollector())
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    httpd = make_server(address, port, make_wsgi_app(registry), handler_class=QuietHandler)
+    print("Prometheus exporter started on http://{}:{}/".format(address, port))
+    httpd.serve_forever()
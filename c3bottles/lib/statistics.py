@@ -1,64 +1,83 @@
+from sqlalchemy import func
+
+from c3bottles import db
+from c3bottles.lib.cache import VersionedCache
 from c3bottles.model.drop_point import DropPoint
+from c3bottles.model.drop_point_state import DropPointState
+from c3bottles.model.hourly_count import HourlyCount
 from c3bottles.model.report import Report
 from c3bottles.model.visit import Visit
 
 
 class Statistics(object):
+    """
+    Aggregate numbers of drop points, reports and visits.
+
+    The reports and visits are not counted one by one but summed up from
+    the hourly counts, which are incremented whenever a report or visit
+    is added. The drop points are counted from their current state, a
+    single row per drop point. Both are cached per data version, so
+    scraping metrics or viewing the statistics does not query the
+    database again until anything has changed, and even then the time
+    taken does not grow with the number of reports and visits.
+    """
+
+    def __init__(self):
+        self._cache = VersionedCache()
 
     @property
     def drop_point_count(self):
-        try:
-            return DropPoint.query.filter(DropPoint.removed == None).count()  # noqa
-        except:  # noqa
-            return 0
+        return sum(self._counts()["drop_points"].values())
 
     @property
     def report_count(self):
-        try:
-            return Report.query.count()
-        except:  # noqa
-            return 0
+        return sum(self._counts()["reports"].values())
 
     @property
     def visit_count(self):
-        try:
-            return Visit.query.count()
-        except:  # noqa
-            return 0
+        return sum(self._counts()["visits"].values())
 
     @property
     def drop_points_by_state(self):
-        ret = {}
-        for state in Report.states:
-            ret[state] = 0
-        try:
-            for dp in DropPoint.query.all():
-                if not dp.removed:
-                    s = dp.last_state
-                    ret[s] = ret[s] + 1 if s in ret else 1
-        except:  # noqa
-            pass
-        return ret
+        return dict(self._counts()["drop_points"])
 
     @property
     def reports_by_state(self):
-        ret = {}
-        for state in Report.states:
-            try:
-                ret[state] = Report.query.filter(Report.state == state).count()
-            except:  # noqa
-                ret[state] = 0
-        return ret
+        return dict(self._counts()["reports"])
 
     @property
     def visits_by_action(self):
-        ret = {}
-        for action in Visit.actions:
-            try:
-                ret[action] = Visit.query.filter(Visit.action == action).count()
-            except:  # noqa
-                ret[action] = 0
-        return ret
+        return dict(self._counts()["visits"])
+
+    def _counts(self):
+        try:
+            return self._cache.get("counts", self._count)
+        except:  # noqa
+            return {
+                "drop_points": dict.fromkeys(Report.states, 0),
+                "reports": dict.fromkeys(Report.states, 0),
+                "visits": dict.fromkeys(Visit.actions, 0),
+            }
+
+    @staticmethod
+    def _count():
+        drop_points = dict.fromkeys(Report.states, 0)
+        drop_points.update(
+            db.session.query(DropPointState.last_state, func.count(DropPointState.dp_id))
+            .join(DropPoint)
+            .filter(DropPoint.removed == None)  # noqa
+            .group_by(DropPointState.last_state)
+        )
+
+        reports = dict.fromkeys(Report.states, 0)
+        visits = dict.fromkeys(Visit.actions, 0)
+        counts = {"report": reports, "visit": visits}
+        for kind, value, count in db.session.query(
+                HourlyCount.kind, HourlyCount.value, func.sum(HourlyCount.count)
+        ).group_by(HourlyCount.kind, HourlyCount.value):
+            counts[kind][value] = int(count)
+
+        return {"drop_points": drop_points, "reports": reports, "visits": visits}
 
 
 stats_obj = Statistics()
@@ -0,0 +1,120 @@
+import json
+from math import atan, degrees, pi, sinh
+
+from c3bottles import app, db
+from c3bottles.lib.cache import VersionedCache
+from c3bottles.model.drop_point import DropPoint
+from c3bottles.model.drop_point_state import DropPointState
+
+
+tile_size = 256
+
+
+def tile_bbox(z, x, y):
+    """
+    Get the bounding box of a map tile.
+
+    Tiles are addressed like the tiles of the map itself, i.e. in the
+    `L.CRS.Simple` coordinate system if the map source uses a simple CRS
+    and in spherical Mercator otherwise. If the map source uses TMS, the
+    y axis is flipped accordingly.
+
+    :return: a tuple (west, south, east, north)
+    """
+    map_source = app.config.get("MAP_SOURCE", {})
+    n = 2 ** z
+    if map_source.get("tms", False):
+        y = n - 1 - y
+    if map_source.get("simple_crs", False):
+        size = tile_size / n
+        return x * size, -(y + 1) * size, (x + 1) * size, -y * size
+
+    def lat(y):
+        return degrees(atan(sinh(pi * (1 - 2 * y / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def get_tile(level, z, x, y):
+    """
+    Get the active drop points on a map tile as GeoJSON.
+
+    Only tiles within the map are served: the zoom level may not exceed
+    the maximum zoom level of the map source (or 30) and the tile has to
+    overlap the bounds of the map source if it has any. The GeoJSON of
+    every tile with drop points is cached per data version. Empty tiles
+    are not cached, so the cache can only grow with the number of drop
+    points and not with the tiles requested.
+
+    :return: a JSON string of a GeoJSON FeatureCollection or None if the
+        tile lies outside of the map
+    """
+    if not _in_map(z, x, y):
+        return None
+    return _tiles_cache.get((level, z, x, y), lambda: json.dumps(
+        {"type": "FeatureCollection", "features": _features(level, z, x, y)},
+        indent=4 if app.debug else None
+    ), keep=lambda tile: tile != _empty_tile())
+
+
+def _in_map(z, x, y):
+    map_source = app.config.get("MAP_SOURCE", {})
+    if not 0 <= z <= map_source.get("max_zoom", 30):
+        return False
+    if not map_source.get("simple_crs", False) and \
+            not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return False
+    bounds = map_source.get("bounds")
+    if bounds:
+        # The bounds are given in GeoJSON order: [[west, south], [east, north]].
+        west, south, east, north = tile_bbox(z, x, y)
+        if west >= bounds[1][0] or east <= bounds[0][0] or \
+                south >= bounds[1][1] or north <= bounds[0][1]:
+            return False
+    return True
+
+
+def _empty_tile():
+    return json.dumps(
+        {"type": "FeatureCollection", "features": []},
+        indent=4 if app.debug else None
+    )
+
+
+def _features(level, z, x, y):
+    west, south, east, north = tile_bbox(z, x, y)
+
+    bounds = app.config.get("MAP_SOURCE", {}).get("bounds")
+    if bounds:
+        west, south = max(west, bounds[0][0]), max(south, bounds[0][1])
+        east, north = min(east, bounds[1][0]), min(north, bounds[1][1])
+
+    query = db.session.query(
+        DropPointState.dp_id,
+        DropPointState.lat,
+        DropPointState.lng,
+        DropPoint.category_id,
+        DropPointState.last_state,
+        DropPointState.new_report_count
+    ).join(DropPoint).filter(
+        DropPoint.removed == None,  # noqa
+        DropPointState.level == level,
+        DropPointState.lat >= south,
+        DropPointState.lat < north,
+        DropPointState.lng >= west,
+        DropPointState.lng < east
+    ).order_by(DropPointState.dp_id)
+
+    return [{
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lng, lat]},
+        "properties": {
+            "number": number,
+            "category_id": category_id,
+            "last_state": last_state,
+            "reports_new": reports_new,
+        },
+    } for number, lat, lng, category_id, last_state, reports_new in query]
+
+
+_tiles_cache = VersionedCache()
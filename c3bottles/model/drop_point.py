@@ -1,11 +1,15 @@
 import json
 from datetime import datetime
-from sqlalchemy import desc
+from sqlalchemy import and_, desc, literal, or_, union_all
+from sqlalchemy.orm import contains_eager
 
-from flask_babel import lazy_gettext
+from flask_babel import lazy_gettext, get_locale
 
 from c3bottles import app, db
+from c3bottles.lib.cache import FragmentCache, VersionedCache
 from c3bottles.model.category import Category, all_categories
+from c3bottles.model.drop_point_change import DropPointChange
+from c3bottles.model.drop_point_state import DropPointState, timestamp
 from c3bottles.model.location import Location
 from c3bottles.model.report import Report
 from c3bottles.model.visit import Visit
@@ -26,6 +30,10 @@ class DropPoint(db.Model):
     consequently the primary key to identify a specific drop point. Since
     the location of drop points may change over time, it is not simply
     saved in the table of drop points but rather a class itself.
+
+    The current location, last report, last visit and everything derived
+    from them is kept up to date in a :class:`DropPointState` which is
+    always loaded together with the drop point itself.
     """
 
     number = db.Column(db.Integer, primary_key=True, autoincrement=False)
@@ -35,6 +43,9 @@ class DropPoint(db.Model):
     locations = db.relationship("Location", order_by="Location.time")
     reports = db.relationship("Report", lazy="dynamic")
     visits = db.relationship("Visit", lazy="dynamic")
+    current = db.relationship(
+        "DropPointState", uselist=False, lazy="joined", back_populates="dp"
+    )
 
     def __init__(
             self,
@@ -84,6 +95,8 @@ class DropPoint(db.Model):
 
         self.time = time if time else datetime.today()
 
+        self.current = DropPointState(self)
+
         try:
             Location(
                 self,
@@ -140,19 +153,19 @@ class DropPoint(db.Model):
 
     @property
     def level(self):
-        return self.locations[-1].level if self.locations else None
+        return self.current.level
 
     @property
     def lat(self):
-        return self.locations[-1].lat if self.locations else None
+        return self.current.lat
 
     @property
     def lng(self):
-        return self.locations[-1].lng if self.locations else None
+        return self.current.lng
 
     @property
     def description(self):
-        return self.locations[-1].description if self.locations else None
+        return self.current.description
 
     @property
     def description_with_level(self):
@@ -168,21 +181,15 @@ class DropPoint(db.Model):
 
     @property
     def location(self):
-        return self.locations[-1] if self.locations else None
+        return self.current.location
 
     @property
     def total_report_count(self):
-        return self.reports.count()
+        return self.current.total_report_count
 
     @property
     def new_report_count(self):
-        last_visit = self.last_visit
-        if last_visit:
-            return self.reports \
-                .filter(Report.time > last_visit.time) \
-                .count()
-        else:
-            return self.total_report_count
+        return self.current.new_report_count
 
     @property
     def last_state(self):
@@ -202,43 +209,25 @@ class DropPoint(db.Model):
 
         If neither reports nor visits have been recorded yet or only visits
         without any actions, the drop point state is returned as new.
-        """
-        last_report = self.last_report
-        last_visit = self.last_visit
-
-        if last_report is not None and last_visit is not None:
-            if last_visit.time > last_report.time:
-                visits = self.visits \
-                    .filter(Visit.time > last_report.time) \
-                    .order_by(Visit.time.desc()) \
-                    .all()
-                for visit in visits:
-                    if visit.action == Visit.actions[0]:
-                        return Report.states[-1]
-                return last_report.state
-
-        if last_report is not None:
-            return last_report.state
-
-        if last_visit is not None:
-            if last_visit.action == Visit.actions[0]:
-                return Report.states[-1]
 
-        return Report.states[1]
+        The state is derived whenever a report or visit is added and kept
+        in the :class:`DropPointState` of the drop point.
+        """
+        return self.current.last_state
 
     @property
     def last_report(self):
         """
         Get the last report of a drop point.
         """
-        return self.reports.order_by(Report.time.desc()).first()
+        return self.current.last_report
 
     @property
     def last_visit(self):
         """
         Get the last visit of a drop point.
         """
-        return self.visits.order_by(Visit.time.desc()).first()
+        return self.current.last_visit
 
     @property
     def new_reports(self):
@@ -250,10 +239,10 @@ class DropPoint(db.Model):
         in the list. If no visits have been recorded yet, all reports are
         returned.
         """
-        last_visit = self.last_visit
-        if last_visit:
+        last_visit_time = self.current.last_visit_time
+        if last_visit_time:
             return self.reports \
-                .filter(Report.time > last_visit.time) \
+                .filter(Report.time > last_visit_time) \
                 .order_by(Report.time.desc()) \
                 .all()
         else:
@@ -261,23 +250,95 @@ class DropPoint(db.Model):
 
     @property
     def history(self):
-        history = []
-
-        for visit in self.visits.all():
-            history.append({"time": visit.time, "visit": visit})
-
-        for report in self.reports.all():
-            history.append({"time": report.time, "report": report})
+        return self.get_history(limit=None)[0]
 
-        for location in self.locations:
-            history.append({"time": location.time, "location": location})
+    def get_history(self, before=None, limit=None):
+        """
+        Get the history of a drop point, newest events first.
+
+        The events are merged and ordered by a single UNION query over
+        visits, reports and locations, so only the events of the page
+        requested are loaded.
+
+        :param before: only return events before this cursor as returned
+            by a previous call
+        :param limit: the maximum number of events to return, all events
+            if not given
+        :return: a tuple of a list of event dicts with the time and the
+            visit, report, location or drop point and the cursor for the
+            next page or None if there are no more events
+        :raises ValueError: If the cursor is invalid. The error message
+            will contain a tuple of dicts which indicate what is invalid.
+        """
 
-        history.append({"time": self.time, "drop_point": self})
+        # Events at the same time are ordered by kind and id.
+        kinds = ("drop_point", "location", "report", "visit", "removed")
+
+        events = union_all(
+            db.session.query(
+                DropPoint.time.label("time"), literal(0).label("kind"),
+                DropPoint.number.label("id")
+            ).filter(DropPoint.number == self.number).statement,
+            db.session.query(Location.time, literal(1), Location.loc_id)
+            .filter(Location.dp_id == self.number).statement,
+            db.session.query(Report.time, literal(2), Report.rep_id)
+            .filter(Report.dp_id == self.number).statement,
+            db.session.query(Visit.time, literal(3), Visit.vis_id)
+            .filter(Visit.dp_id == self.number).statement,
+            db.session.query(DropPoint.removed, literal(4), DropPoint.number)
+            .filter(DropPoint.number == self.number, DropPoint.removed != None)  # noqa
+            .statement
+        ).alias("events")
+
+        query = db.session.query(events.c.time, events.c.kind, events.c.id)
+
+        if before is not None:
+            try:
+                time, kind, id_ = before.split(",")
+                time = datetime.strptime(time, "%Y-%m-%dT%H:%M:%S.%f")
+                kind, id_ = kinds.index(kind), int(id_)
+            except (AttributeError, ValueError):
+                raise ValueError({"before": lazy_gettext("Invalid history cursor.")})
+            query = query.filter(or_(
+                events.c.time < time,
+                and_(events.c.time == time, or_(
+                    events.c.kind < kind,
+                    and_(events.c.kind == kind, events.c.id < id_)
+                ))
+            ))
+
+        query = query.order_by(desc(events.c.time), desc(events.c.kind), desc(events.c.id))
+        rows = query.limit(limit + 1).all() if limit is not None else query.all()
+
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            time, kind, id_ = rows[-1]
+            cursor = "{},{},{}".format(
+                time.strftime("%Y-%m-%dT%H:%M:%S.%f"), kinds[kind], id_
+            )
+        else:
+            cursor = None
+
+        objects = {}
+        for kind, model, column in (
+                (1, Location, Location.loc_id),
+                (2, Report, Report.rep_id),
+                (3, Visit, Visit.vis_id)):
+            ids = [i for _, k, i in rows if k == kind]
+            if ids:
+                objects.update(
+                    ((kind, getattr(o, column.key)), o)
+                    for o in model.query.filter(column.in_(ids))
+                )
 
-        if self.removed:
-            history.append({"time": self.removed, "removed": True})
+        history = []
+        for time, kind, id_ in rows:
+            if kind in (0, 4):
+                history.append({"time": time, kinds[kind]: self if kind == 0 else True})
+            else:
+                history.append({"time": time, kinds[kind]: objects[(kind, id_)]})
 
-        return sorted(history, key=lambda k: k["time"], reverse=True)
+        return history, cursor
 
     @property
     def visit_interval(self):
@@ -307,8 +368,6 @@ class DropPoint(db.Model):
         if self.removed:
             return 0
 
-        new_reports = self.new_reports
-
         # This is the starting priority. The report weight should
         # be scaled relative to 1, so this can be interpreted as a
         # number of standing default reports ensuring that every
@@ -316,10 +375,10 @@ class DropPoint(db.Model):
         # visited even if no real reports come in.
         priority = app.config.get("DEFAULT_VISIT_PRIORITY", 1)
 
-        i = 0
-        for report in new_reports:
-            priority += report.get_weight() / 2**i
-            i += 1
+        # The weights of the reports since the last visit are kept
+        # summed up in the drop point state with every report counting
+        # half as much as the next newer one.
+        priority += self.current.report_weight_sum
 
         priority /= (1.0 * self.visit_interval)
 
@@ -333,8 +392,8 @@ class DropPoint(db.Model):
         This is either the time of the last visit, or, if no visit has been
         performed yet, the creation time of the drop point.
         """
-        if self.last_visit:
-            return self.last_visit.time
+        if self.current.last_visit_time:
+            return self.current.last_visit_time
         else:
             return self.time
 
@@ -360,26 +419,30 @@ class DropPoint(db.Model):
     def get_dp_info(cls, number):
         dp = cls.query.get(number)
         if dp is not None:
-            return {
-                "number": dp.number,
-                "category_id": dp.category_id,
-                "category": str(dp.category),
-                "description": dp.description,
-                "description_with_level": str(dp.description_with_level),
-                "reports_total": dp.total_report_count,
-                "reports_new": dp.new_report_count,
-                "priority": dp.priority,
-                "priority_factor": dp.priority_factor,
-                "base_time": dp.priority_base_time.strftime("%s"),
-                "last_state": dp.last_state,
-                "removed": True if dp.removed else False,
-                "lat": dp.lat,
-                "lng": dp.lng,
-                "level": dp.level
-            }
+            return dp._get_info()
         else:
             return None
 
+    @classmethod
+    def get_dps_info(cls, dps, fields=None):
+        """
+        Get the info dicts of many drop points at once.
+
+        This returns the same dicts as :meth:`get_dp_info()` indexed by drop
+        point number in the order of the drop points given. As the current
+        state is loaded together with the drop points, no further queries
+        are needed.
+
+        :param fields: the names of the fields in :data:`info_fields` to
+            include, all fields if not given. Fields which are not
+            included are not computed at all.
+        """
+        getters = [(f, g) for f, g in info_fields if fields is None or f in fields]
+        return {dp.number: {f: g(dp) for f, g in getters} for dp in dps}
+
+    def _get_info(self):
+        return {f: g(self) for f, g in info_fields}
+
     @classmethod
     def get_dp_json(cls, number):
         """
@@ -393,19 +456,96 @@ class DropPoint(db.Model):
             indent=4 if app.debug else None
         )
 
+    @classmethod
+    def get_dps_columns(cls, dps, fields=None):
+        """
+        Get the info of many drop points in a compact columnar form.
+
+        Instead of a dict per drop point, this returns a list of values
+        per field in :data:`compact_columns`. Fields which can be derived
+        on the client (the localized category, the description with level
+        and the current priority) are left out. The last state is given
+        as an index into the list of states returned along with the
+        columns.
+
+        :param fields: the names of the fields to include as in
+            :meth:`get_dps_info()`
+        """
+        states = {s: i for i, s in enumerate(Report.states)}
+        getters = dict(info_fields)
+        getters["base_time"] = lambda dp: int(timestamp(dp.priority_base_time))
+        getters["last_state"] = lambda dp: states[dp.last_state]
+        columns = {
+            c: [getters[c](dp) for dp in dps]
+            for c in compact_columns if fields is None or c in fields
+        }
+        return {"states": Report.states, "columns": columns}
+
     @staticmethod
-    def get_dps_json(time=None):
+    def get_dps_json(time=None, fields=None, compact=False, **filters):
         """
         Get drop points as a JSON string.
 
+        This takes the same arguments as :meth:`iter_dps_json()`.
+        """
+        return "".join(DropPoint.iter_dps_json(time, fields, compact, **filters))
+
+    @staticmethod
+    def iter_dps_json(time=None, fields=None, compact=False, **filters):
+        """
+        Get drop points as a JSON string in chunks.
+
         If a time has been given as optional parameters, only drop points
         are returned that have changes since that time stamp, i.e. have
         been created, visited, reported or changed their location.
+
+        Otherwise, the drop points can be limited by the filters accepted
+        by :meth:`get_dps_in()`.
+
+        If `compact` is set, the drop points are returned in the columnar
+        form of :meth:`get_dps_columns()` instead of a dict per drop point.
+        Either way, only the given fields are computed and returned.
+
+        The JSON of every single drop point except for its time-dependent
+        priority is cached until the drop point changes, so a response
+        with all fields is put together from cached fragments. If the
+        fields are limited to :data:`fragment_fields`, the response does
+        not change over time and can be cached by clients. The JSON
+        strings of other selections of all drop points (of a level or
+        category) are cached per data version and locale.
+
+        A response with all fields or :data:`fragment_fields` is produced
+        while the drop points are fetched from the database in batches, so
+        memory usage does not grow with the number of drop points. It is
+        the same as if the dict of all drop points was dumped at once. In
+        debug mode, the JSON is indented and therefore dumped at once.
+
+        :return: an iterator over the chunks of the JSON string
+        :raises ValueError: If any of the fields or filters is invalid.
+            The error message will contain a tuple of dicts which indicate
+            which parameter is invalid. Everything is validated before
+            this method returns, so the iterator itself does not raise.
         """
 
+        if fields is not None:
+            fields = parse_fields(fields)
+            if fields is None:
+                raise ValueError({"fields": lazy_gettext("Unknown field.")})
+
+        def dump(dps):
+            return json.dumps(
+                DropPoint.get_dps_columns(dps, fields) if compact
+                else DropPoint.get_dps_info(dps, fields),
+                indent=4 if app.debug else None
+            )
+
         if time is None:
-            dps = DropPoint.query.all()
-        else:
+            filters = DropPoint.parse_filters(**filters)
+            query = DropPoint.get_dps_query(**filters)
+
+        def load():
+            if time is None:
+                return query.yield_per(chunk_size)
             dp_set = set()
             dp_set.update(
                 [dp for dp in DropPoint.query.filter(DropPoint.time > time).all()],
@@ -413,14 +553,273 @@ class DropPoint(db.Model):
                 [v.dp for v in Visit.query.filter(Visit.time > time).all()],
                 [r.dp for r in Report.query.filter(Report.time > time).all()]
             )
-            dps = list(dp_set)
+            return list(dp_set)
+
+        if not compact and fields in (None, fragment_fields) and not app.debug:
+            return DropPoint._iter_fragments(load, priority=fields is None)
+        elif time is None and filters.get("bbox") is None and filters.get("numbers") is None:
+            # The compact form does not contain any localized strings. The
+            # filters have been normalized, so equivalent requests share an
+            # entry. Empty results are not cached, so the cache does not
+            # grow with requests for levels without drop points.
+            return iter([_dps_json_cache.get(
+                (
+                    None if compact else str(get_locale()), compact, fields,
+                    tuple(sorted((k, v) for k, v in filters.items() if v is not None))
+                ),
+                lambda: dump(list(load())),
+                keep=lambda value: value != dump([])
+            )])
+        else:
+            return iter([dump(list(load()))])
+
+    @staticmethod
+    def _iter_fragments(load, priority=True):
+        before = info_fields[:priority_index]
+        after = info_fields[priority_index + 1:]
+        entries = _fragments.iter_all(
+            str(get_locale()),
+            load,
+            # The JSON of the info dict split where the priority belongs,
+            # so it can be put in between at its original position.
+            lambda dp: (
+                json.dumps({f: g(dp) for f, g in before})[:-1],
+                json.dumps({f: g(dp) for f, g in after})[1:]
+            )
+        )
+        chunk, sep = [], "{"
+        for dp, (head, tail) in entries:
+            if priority:
+                chunk.append('{}"{}": {}, "priority": {}, {}'.format(
+                    sep, dp.number, head, json.dumps(dp.priority), tail
+                ))
+            else:
+                chunk.append('{}"{}": {}, {}'.format(sep, dp.number, head, tail))
+            sep = ", "
+            if len(chunk) >= chunk_size:
+                yield "".join(chunk)
+                chunk = []
+        chunk.append("}" if sep == ", " else "{}")
+        yield "".join(chunk)
+
+    @staticmethod
+    def get_dps_in(**filters):
+        """
+        Get the drop points currently located in a part of the venue.
+
+        This takes the same arguments as :meth:`get_dps_query()`.
+
+        :return: a list of drop points
+        """
+        return DropPoint.get_dps_query(**filters).all()
+
+    @staticmethod
+    def parse_filters(level=None, bbox=None, category_id=None, removed=None, numbers=None):
+        """
+        Parse the filters selecting drop points.
+
+        Every filter is converted to a canonical value, so equivalent
+        filters given in different ways (e.g. `level=01` and `level=1` or
+        the same numbers in a different order) are equal.
+
+        :param level: only select drop points on this level
+        :param bbox: only select drop points inside this bounding box,
+            given as a string "west,south,east,north" like Leaflet's
+            `LatLngBounds.toBBoxString()` or as a sequence of four numbers
+        :param category_id: only select drop points of this category
+        :param removed: only select removed drop points if true or only
+            drop points which have not been removed if false, given as a
+            bool or a string like "true" or "0"
+        :param numbers: only select these drop points, given as a comma
+            separated string or a sequence of numbers
+        :return: a dict of the filters with the level and category as
+            int, the bounding box as tuple of floats, removed as bool and
+            the numbers as sorted tuple of distinct ints, each of them None
+            if not given
+        :raises ValueError: If any of the filters is invalid. The error
+            message will contain a tuple of dicts which indicate which
+            parameter is invalid.
+        """
+
+        errors = []
+
+        if category_id is not None:
+            try:
+                category_id = int(category_id)
+            except (TypeError, ValueError):
+                category_id = None
+            if category_id not in all_categories:
+                errors.append({"cat_id": lazy_gettext("Invalid drop point category.")})
+
+        if isinstance(removed, str):
+            removed = {"true": True, "1": True, "false": False, "0": False} \
+                .get(removed.strip().lower(), removed)
+        if removed is not None and not isinstance(removed, bool):
+            errors.append({"removed": lazy_gettext("Removed is not a boolean.")})
+
+        if numbers is not None:
+            try:
+                if isinstance(numbers, str):
+                    numbers = numbers.split(",")
+                numbers = tuple(sorted({int(n) for n in numbers}))
+            except (TypeError, ValueError):
+                errors.append({"numbers": lazy_gettext("Drop point number is not a number.")})
+
+        if level is not None:
+            try:
+                level = int(level)
+            except (TypeError, ValueError):
+                errors.append({"level": lazy_gettext("Level is not a number.")})
+
+        if bbox is not None:
+            bbox = parse_bbox(bbox)
+            if bbox is None:
+                errors.append({"bbox": lazy_gettext("Invalid bounding box.")})
+
+        if errors:
+            raise ValueError(*errors)
+
+        return {
+            "level": level,
+            "bbox": bbox,
+            "category_id": category_id,
+            "removed": removed,
+            "numbers": numbers,
+        }
+
+    @staticmethod
+    def get_dps_query(**filters):
+        """
+        Get a query for the drop points currently located in a part of the
+        venue, ordered by number.
+
+        This takes the same arguments as :meth:`parse_filters()`.
+
+        :return: a query of drop points
+        :raises ValueError: If any of the filters is invalid. The error
+            message will contain a tuple of dicts which indicate which
+            parameter is invalid.
+        """
+
+        filters = DropPoint.parse_filters(**filters)
+
+        query = DropPoint.query \
+            .join(DropPoint.current) \
+            .options(contains_eager(DropPoint.current))
+        if filters["category_id"] is not None:
+            query = query.filter(DropPoint.category_id == filters["category_id"])
+        if filters["removed"] is not None:
+            query = query.filter(
+                DropPoint.removed != None if filters["removed"]  # noqa
+                else DropPoint.removed == None  # noqa
+            )
+        if filters["numbers"] is not None:
+            query = query.filter(DropPoint.number.in_(filters["numbers"]))
+        if filters["level"] is not None:
+            query = query.filter(DropPointState.level == filters["level"])
+        if filters["bbox"] is not None:
+            west, south, east, north = filters["bbox"]
+            query = query.filter(
+                DropPointState.lat.between(south, north),
+                DropPointState.lng.between(west, east)
+            )
+        return query.order_by(DropPoint.number)
+
+    @staticmethod
+    def get_changes(cursor):
+        """
+        Get the drop points changed since a cursor.
+
+        Cursors are issued by :meth:`DropPointChange.get_cursor()` and by
+        this method.
+
+        :return: a tuple of the info dicts of the changed drop points as
+            returned by :meth:`get_dps_info()` and the cursor to use for
+            the next call
+        """
+        numbers, cursor = DropPointChange.since(cursor)
+        if numbers:
+            dps = DropPoint.query.filter(DropPoint.number.in_(numbers)).all()
+        else:
+            dps = []
+        return DropPoint.get_dps_info(dps), cursor
+
+    @staticmethod
+    def get_changes_json(cursor):
+        """
+        Get the drop points changed since a cursor as a JSON string.
+
+        The JSON object contains the changed drop points and the cursor
+        to use for the next call as returned by :meth:`get_changes()`.
+        """
+        dps, cursor = DropPoint.get_changes(cursor)
+        return json.dumps(
+            {"cursor": cursor, "drop_points": dps},
+            indent=4 if app.debug else None
+        )
+
+    @staticmethod
+    def get_queue(limit=10, category_id=None, level=None):
+        """
+        Get the drop points to visit next.
+
+        The drop points are ranked by their current priority in the
+        database using the weights and base times kept in their state, so
+        only the drop points returned are loaded.
+
+        :param limit: the maximum number of drop points to return
+        :param category_id: only return drop points of this category
+        :param level: only return drop points on this level
+        :return: a list of the info dicts of the drop points with the
+            highest priority first
+        :raises ValueError: If any of the parameters is invalid. The error
+            message will contain a tuple of dicts which indicate which
+            parameter is invalid.
+        """
 
-        ret = {}
+        errors = []
+
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            errors.append({"limit": lazy_gettext("Limit is not a number.")})
+        else:
+            if not 0 < limit <= app.config.get("QUEUE_MAX_LIMIT", 100):
+                errors.append({"limit": lazy_gettext("Limit is out of range.")})
+
+        if category_id is not None:
+            try:
+                category_id = int(category_id)
+            except (TypeError, ValueError):
+                category_id = None
+            if category_id not in all_categories:
+                errors.append({"cat_id": lazy_gettext("Invalid drop point category.")})
+
+        if level is not None:
+            try:
+                level = int(level)
+            except (TypeError, ValueError):
+                errors.append({"level": lazy_gettext("Level is not a number.")})
+
+        if errors:
+            raise ValueError(*errors)
 
-        for dp in dps:
-            ret[dp.number] = DropPoint.get_dp_info(dp.number)
+        query = DropPoint.query \
+            .join(DropPoint.current) \
+            .options(contains_eager(DropPoint.current)) \
+            .filter(DropPoint.removed == None)  # noqa
+        if category_id is not None:
+            query = query.filter(DropPoint.category_id == category_id)
+        if level is not None:
+            query = query.filter(DropPointState.level == level)
+        # Drop points without a base time cannot be ranked and would come
+        # first in descending order on PostgreSQL.
+        query = query.order_by(
+            desc(DropPointState.priority_at(timestamp(datetime.today()))).nullslast(),
+            DropPoint.number
+        )
 
-        return json.dumps(ret, indent=4 if app.debug else None)
+        return [dp._get_info() for dp in query.limit(limit)]
 
     @staticmethod
     def get_next_free_number():
@@ -440,3 +839,115 @@ class DropPoint(db.Model):
             self.number,
             "inactive" if self.removed else "active"
         )
+
+
+history_page_size = 50
+"""
+The number of events shown at once in the history of a drop point.
+"""
+
+chunk_size = 100
+"""
+The number of drop points fetched from the database and sent at once when
+streaming JSON.
+"""
+
+info_fields = (
+    ("number", lambda dp: dp.number),
+    ("category_id", lambda dp: dp.category_id),
+    ("category", lambda dp: str(dp.category)),
+    ("description", lambda dp: dp.description),
+    ("description_with_level", lambda dp: str(dp.description_with_level)),
+    ("reports_total", lambda dp: dp.total_report_count),
+    ("reports_new", lambda dp: dp.new_report_count),
+    ("priority", lambda dp: dp.priority),
+    ("priority_factor", lambda dp: dp.priority_factor),
+    ("base_time", lambda dp: dp.priority_base_time.strftime("%s")),
+    ("last_state", lambda dp: dp.last_state),
+    ("removed", lambda dp: True if dp.removed else False),
+    ("lat", lambda dp: dp.lat),
+    ("lng", lambda dp: dp.lng),
+    ("level", lambda dp: dp.level),
+)
+"""
+The fields of the info dict of a drop point and how to get them.
+"""
+
+fragment_fields = tuple(f for f, _ in info_fields if f != "priority")
+"""
+The fields of drop points which only change when the drop point changes.
+"""
+
+priority_index = [f for f, _ in info_fields].index("priority")
+
+compact_columns = (
+    "number", "category_id", "description", "reports_total", "reports_new",
+    "priority_factor", "base_time", "last_state", "removed", "lat", "lng",
+    "level"
+)
+"""
+The fields of drop points in the compact form of :meth:`DropPoint.get_dps_columns()`.
+"""
+
+
+def parse_fields(fields):
+    """
+    Parse a selection of drop point info fields.
+
+    :param fields: a comma separated string or a sequence of field names
+    :return: a tuple of the field names in the order of
+        :data:`info_fields` or None if any of them is unknown
+    """
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    fields = set(fields)
+    ret = tuple(f for f, _ in info_fields if f in fields)
+    if len(ret) != len(fields):
+        return None
+    return ret
+
+
+def parse_bbox(bbox):
+    """
+    Parse a bounding box.
+
+    :param bbox: a string "west,south,east,north" like Leaflet's
+        `LatLngBounds.toBBoxString()` or a sequence of four numbers
+    :return: a tuple (west, south, east, north) of floats or None if the
+        bounding box is invalid
+    """
+    try:
+        if isinstance(bbox, str):
+            bbox = bbox.split(",")
+        west, south, east, north = (float(x) for x in bbox)
+    except (TypeError, ValueError):
+        return None
+    if west > east or south > north:
+        return None
+    return west, south, east, north
+
+
+_dps_json_cache = VersionedCache()
+_fragments = FragmentCache()
+
+
+@app.cli.group("dp")
+def drop_point_management():
+    """
+    Drop point management.
+
+    These commands allow maintenance of the drop point database.
+    """
+
+
+@drop_point_management.command("rebuild")
+def rebuild_state():
+    """
+    Rebuilds the current state of all drop points.
+
+    This can be used whenever the current state seems to be out of sync
+    with the reports, visits and locations recorded.
+    """
+    DropPointState.rebuild()
+    db.session.commit()
+    print("State of {} drop points rebuilt.".format(DropPoint.query.count()))
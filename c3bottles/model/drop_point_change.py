@@ -0,0 +1,189 @@
+import os
+from datetime import datetime
+from threading import Condition, Event, Thread
+
+from sqlalchemy import event, text
+
+from c3bottles import app, db
+from c3bottles.model import drop_point
+from c3bottles.model.location import Location
+from c3bottles.model.report import Report
+from c3bottles.model.visit import Visit
+
+
+_committed = Condition()
+_poke = Event()
+_latest = 0
+_waiters = 0
+_poller_pid = None
+
+lock_id = 0x63336274
+"""
+The key of the PostgreSQL advisory lock serializing writes to the log.
+"""
+
+
+class DropPointChange(db.Model):
+    """
+    An entry in the append-only log of changes to drop points.
+
+    Whenever a drop point is created, edited, reported, visited or
+    relocated, an entry with a monotonically increasing sequence number
+    is written in the same transaction. Clients keep the sequence number
+    of the last change they have seen as a cursor and only need to fetch
+    the drop points changed since then.
+
+    As sequence numbers are assigned when an entry is inserted and not
+    when it is committed, the transactions writing to the log are
+    serialized by :meth:`lock()`. Otherwise, a cursor could be handed out
+    for a change committed before an older change of another transaction,
+    and clients would never see the older change.
+    """
+
+    seq = db.Column(db.Integer, primary_key=True)
+
+    dp_id = db.Column(
+        db.Integer,
+        db.ForeignKey("drop_point.number"),
+        nullable=False
+    )
+
+    time = db.Column(db.DateTime, nullable=False)
+
+    def __init__(self, dp_id, time=None):
+        self.dp_id = dp_id
+        self.time = time if time else datetime.today()
+
+    @classmethod
+    def get_cursor(cls):
+        """
+        Get the sequence number of the latest change.
+
+        :return: the cursor to pass to :meth:`since()` to get all changes
+            happening after this call
+        """
+        return db.session.query(db.func.max(cls.seq)).scalar() or 0
+
+    @classmethod
+    def since(cls, cursor):
+        """
+        Get the numbers of all drop points changed after a cursor.
+
+        :param cursor: a cursor as returned by :meth:`get_cursor()` or
+            by a previous call of this method
+        :return: a tuple of the changed drop point numbers in the order of
+            their first change and the cursor for the next call
+        """
+        numbers = {}
+        for seq, dp_id in db.session.query(cls.seq, cls.dp_id) \
+                .filter(cls.seq > cursor).order_by(cls.seq):
+            numbers.setdefault(dp_id, seq)
+            cursor = seq
+        return list(numbers), cursor
+
+    @staticmethod
+    def lock(session):
+        """
+        Wait until no other transaction can write to the change log.
+
+        This has to be called before adding entries. The lock is held
+        until the end of the transaction, so changes are committed in
+        the order of their sequence numbers. SQLite only allows a single
+        writing transaction at a time anyway.
+        """
+        if db.engine.dialect.name == "postgresql":
+            session.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": lock_id})
+
+    @staticmethod
+    def poll():
+        """
+        Look up the latest change and wake up everyone waiting for it.
+
+        This is done by a single thread per process while anyone is
+        waiting in :meth:`wait()`, every `STREAM_POLL_INTERVAL` seconds
+        and right after commits of this process logging changes.
+        """
+        global _latest
+        cursor = DropPointChange.get_cursor()
+        with _committed:
+            if cursor > _latest:
+                _latest = cursor
+                _committed.notify_all()
+
+    @staticmethod
+    def wait(cursor, timeout):
+        """
+        Wait until changes after a cursor are known or the timeout has
+        passed.
+
+        The database is not queried by the waiting thread itself but by a
+        single poller thread per process, so many waiting threads cost no
+        more queries than one.
+
+        :return: True if there are changes after the cursor
+        """
+        global _waiters, _poller_pid
+        with _committed:
+            _waiters += 1
+            if _poller_pid != os.getpid():
+                _poller_pid = os.getpid()
+                Thread(target=_poll, daemon=True).start()
+            try:
+                return _committed.wait_for(lambda: _latest > cursor, timeout)
+            finally:
+                _waiters -= 1
+
+    def __repr__(self):
+        return "Change %s of drop point %s at %s" % (
+            self.seq, self.dp_id, self.time
+        )
+
+
+@event.listens_for(db.session, "before_flush")
+def log_changes(session, flush_context, instances):
+    """
+    Add a change log entry for every drop point touched by a flush.
+    """
+    numbers = set()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, drop_point.DropPoint):
+            if obj in session.new or session.is_modified(obj):
+                numbers.add(obj.number)
+        elif isinstance(obj, (Location, Report, Visit)) and obj.dp is not None:
+            numbers.add(obj.dp.number)
+    if numbers:
+        DropPointChange.lock(session)
+        session.info["dp_changed"] = True
+    for number in sorted(numbers):
+        session.add(DropPointChange(number))
+
+
+@event.listens_for(db.session, "after_commit")
+def notify_changes(session):
+    """
+    Let the poller look up the changes right away if a commit logged any.
+    """
+    if session.info.pop("dp_changed", False):
+        _poke.set()
+
+
+@event.listens_for(db.session, "after_rollback")
+def forget_changes(session):
+    session.info.pop("dp_changed", None)
+
+
+def _poll():
+    global _poller_pid
+    while True:
+        _poke.wait(app.config.get("STREAM_POLL_INTERVAL", 5))
+        _poke.clear()
+        with _committed:
+            if not _waiters:
+                _poller_pid = None
+                return
+        try:
+            with app.app_context():
+                DropPointChange.poll()
+                db.session.remove()
+        except Exception:  # noqa
+            app.logger.exception("Looking up the latest drop point change failed.")
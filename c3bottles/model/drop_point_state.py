@@ -0,0 +1,287 @@
+from datetime import datetime
+from time import mktime
+
+from sqlalchemy import and_, func
+
+from c3bottles import app, db
+from c3bottles.model import drop_point
+from c3bottles.model.location import Location
+from c3bottles.model.report import Report
+from c3bottles.model.visit import Visit
+
+
+class DropPointState(db.Model):
+    """
+    The current state of a drop point.
+
+    Everything displayed about a drop point depends on its current
+    location, its last report and its last visit. Instead of deriving all
+    of this from the complete history of the drop point on every read, it
+    is kept in a single row per drop point which is updated in the same
+    transaction whenever a location, report or visit is added.
+
+    The weights of the reports since the last visit are accumulated in
+    `report_weight_sum` with every older report counting half as much as
+    the next newer one. As this halves the previous sum whenever a new
+    report arrives, it can be updated without looking at older reports.
+
+    The base time of the visit priority is kept in `priority_base` as
+    seconds since the epoch. As the priority of a drop point is the
+    product of its weight and the time passed since then, all drop points
+    can be ranked by priority in the database (see :meth:`priority_at()`)
+    without loading them.
+
+    The current positions are indexed by level, latitude and longitude, so
+    the drop points within a part of a single level can be found without
+    looking at all of them.
+
+    The states of drop points which existed before this table was added
+    are filled in by a migration. If this table ever gets out of sync with
+    the history, it can be rebuilt by :meth:`rebuild()`.
+    """
+
+    __table_args__ = (
+        db.Index("ix_drop_point_state_position", "level", "lat", "lng"),
+    )
+
+    dp_id = db.Column(
+        db.Integer,
+        db.ForeignKey("drop_point.number"),
+        primary_key=True,
+        autoincrement=False
+    )
+
+    dp = db.relationship("DropPoint", back_populates="current")
+
+    loc_id = db.Column(db.Integer, db.ForeignKey("location.loc_id"))
+    location = db.relationship("Location")
+    location_time = db.Column(db.DateTime)
+    description = db.Column(db.String(Location.max_description))
+    lat = db.Column(db.Float)
+    lng = db.Column(db.Float)
+    level = db.Column(db.Integer)
+
+    last_report_id = db.Column(db.Integer, db.ForeignKey("report.rep_id"))
+    last_report = db.relationship("Report")
+    last_report_time = db.Column(db.DateTime)
+    last_report_state = db.Column(db.Enum(*Report.states, name="report_states"))
+
+    last_visit_id = db.Column(db.Integer, db.ForeignKey("visit.vis_id"))
+    last_visit = db.relationship("Visit")
+    last_visit_time = db.Column(db.DateTime)
+    last_visit_action = db.Column(db.Enum(*Visit.actions, name="visit_actions"))
+    last_emptied_time = db.Column(db.DateTime)
+
+    last_state = db.Column(
+        db.Enum(*Report.states, name="report_states"),
+        nullable=False,
+        default=Report.states[1]
+    )
+
+    total_report_count = db.Column(db.Integer, nullable=False, default=0)
+    new_report_count = db.Column(db.Integer, nullable=False, default=0)
+    report_weight_sum = db.Column(db.Float, nullable=False, default=0.0)
+    priority_base = db.Column(db.Float)
+
+    def __init__(self, dp):
+        self.dp = dp
+        if isinstance(dp.time, datetime):
+            self.priority_base = timestamp(dp.time)
+        self.last_state = Report.states[1]
+        self.total_report_count = 0
+        self.new_report_count = 0
+        self.report_weight_sum = 0.0
+
+    def add_location(self, location):
+        """
+        Update the state after a location has been added.
+        """
+        if self.location_time is None or location.time >= self.location_time:
+            self.location = location
+            self.location_time = location.time
+            self.description = location.description
+            self.lat = location.lat
+            self.lng = location.lng
+            self.level = location.level
+
+    def add_report(self, report):
+        """
+        Update the state after a report has been added.
+        """
+        self.total_report_count += 1
+        if self.last_visit_time is None or report.time > self.last_visit_time:
+            self.new_report_count += 1
+            if self.last_report_time is None or report.time >= self.last_report_time:
+                self.report_weight_sum = report.get_weight() + self.report_weight_sum / 2
+            else:
+                self.report_weight_sum = self._sum_report_weights()
+        if self.last_report_time is None or report.time >= self.last_report_time:
+            self.last_report = report
+            self.last_report_time = report.time
+            self.last_report_state = report.state
+        self.last_state = self.derive_last_state()
+
+    def add_visit(self, visit):
+        """
+        Update the state after a visit has been added.
+
+        In the usual case of a visit being newer than all reports, this
+        does not need any queries. If a visit is added before the last
+        report, the reports after that visit have to be looked at again.
+        """
+        if visit.action == Visit.actions[0] and (
+                self.last_emptied_time is None or visit.time > self.last_emptied_time):
+            self.last_emptied_time = visit.time
+        if self.last_visit_time is None or visit.time >= self.last_visit_time:
+            self.last_visit = visit
+            self.last_visit_time = visit.time
+            self.last_visit_action = visit.action
+            self.priority_base = timestamp(visit.time)
+            if self.last_report_time is None or visit.time >= self.last_report_time:
+                self.new_report_count = 0
+                self.report_weight_sum = 0.0
+            else:
+                db.session.flush()
+                self.new_report_count = Report.query.filter(
+                    Report.dp_id == self.dp_id,
+                    Report.time > visit.time
+                ).count()
+                self.report_weight_sum = self._sum_report_weights()
+        self.last_state = self.derive_last_state()
+
+    def _sum_report_weights(self):
+        db.session.flush()
+        reports = Report.query.filter(Report.dp_id == self.dp_id)
+        if self.last_visit_time is not None:
+            reports = reports.filter(Report.time > self.last_visit_time)
+        states = reports.with_entities(Report.state).order_by(Report.time.desc())
+        return sum_report_weights(Report.get_state_weight(s) for (s,) in states)
+
+    @classmethod
+    def priority_at(cls, now):
+        """
+        Get an SQL expression ordering drop points by visit priority.
+
+        The expression is proportional to :attr:`DropPoint.priority` of
+        drop points which have not been removed.
+
+        :param now: the time to rank the priorities at in seconds since
+            the epoch
+        """
+        return (app.config.get("DEFAULT_VISIT_PRIORITY", 1) + cls.report_weight_sum) * \
+            (now - cls.priority_base)
+
+    def derive_last_state(self):
+        """
+        Derive the current state of a drop point.
+
+        See :attr:`DropPoint.last_state` for the rules applied.
+        """
+        if self.last_report_time is not None:
+            if self.last_emptied_time is not None and \
+                    self.last_emptied_time > self.last_report_time:
+                return Report.states[-1]
+            return self.last_report_state
+
+        if self.last_visit_action == Visit.actions[0]:
+            return Report.states[-1]
+
+        return Report.states[1]
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Rebuild the current state of all drop points from their history.
+
+        This runs a fixed number of grouped queries over all locations,
+        reports and visits and replaces the state rows of all drop points.
+        """
+
+        def latest(model, time_column, id_column):
+            sub = db.session.query(
+                model.dp_id.label("dp_id"), func.max(time_column).label("time")
+            ).group_by(model.dp_id).subquery()
+            ret = {}
+            for obj in model.query.join(sub, and_(
+                    model.dp_id == sub.c.dp_id,
+                    time_column == sub.c.time)).order_by(id_column):
+                ret[obj.dp_id] = obj
+            return ret, sub
+
+        locations, _ = latest(Location, Location.time, Location.loc_id)
+        reports, _ = latest(Report, Report.time, Report.rep_id)
+        visits, last_visit = latest(Visit, Visit.time, Visit.vis_id)
+
+        last_emptied = dict(db.session.query(
+            Visit.dp_id, func.max(Visit.time)
+        ).filter(Visit.action == Visit.actions[0]).group_by(Visit.dp_id))
+
+        total_report_counts = dict(db.session.query(
+            Report.dp_id, func.count(Report.rep_id)
+        ).group_by(Report.dp_id))
+
+        new_report_weights = {}
+        for dp_id, state in db.session.query(Report.dp_id, Report.state) \
+                .outerjoin(last_visit, Report.dp_id == last_visit.c.dp_id) \
+                .filter(db.or_(last_visit.c.time == None,  # noqa
+                               Report.time > last_visit.c.time)) \
+                .order_by(Report.dp_id, Report.time.desc()):
+            new_report_weights.setdefault(dp_id, []).append(Report.get_state_weight(state))
+
+        states = {s.dp_id: s for s in cls.query.all()}
+
+        for dp in drop_point.DropPoint.query.all():
+            state = states.get(dp.number)
+            if state is None:
+                state = cls(dp)
+                db.session.add(state)
+
+            location = locations.get(dp.number)
+            state.location = location
+            state.location_time = location.time if location else None
+            state.description = location.description if location else None
+            state.lat = location.lat if location else None
+            state.lng = location.lng if location else None
+            state.level = location.level if location else None
+
+            report = reports.get(dp.number)
+            state.last_report = report
+            state.last_report_time = report.time if report else None
+            state.last_report_state = report.state if report else None
+
+            visit = visits.get(dp.number)
+            state.last_visit = visit
+            state.last_visit_time = visit.time if visit else None
+            state.last_visit_action = visit.action if visit else None
+            state.last_emptied_time = last_emptied.get(dp.number)
+            state.priority_base = timestamp(visit.time if visit else dp.time)
+
+            state.total_report_count = total_report_counts.get(dp.number, 0)
+            weights = new_report_weights.get(dp.number, [])
+            state.new_report_count = len(weights)
+            state.report_weight_sum = sum_report_weights(weights)
+            state.last_state = state.derive_last_state()
+
+    def __repr__(self):
+        return "State of drop point %s (%s)" % (
+            self.dp_id, self.last_state
+        )
+
+
+def timestamp(time):
+    """
+    Convert a local time to seconds since the epoch.
+    """
+    return mktime(time.timetuple()) + time.microsecond / 1e6
+
+
+def sum_report_weights(weights):
+    """
+    Sum up report weights ordered from the newest to the oldest report.
+
+    Each report counts half as much as the next newer one.
+    """
+    ret = 0.0
+    for weight in reversed(list(weights)):
+        ret = weight + ret / 2
+    return ret
@@ -0,0 +1,309 @@
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask_babel import lazy_gettext
+from sqlalchemy import event, func
+from sqlalchemy.dialects import postgresql
+
+from c3bottles import app, db
+from c3bottles.model import drop_point
+from c3bottles.model.drop_point_change import DropPointChange
+from c3bottles.model.drop_point_state import timestamp
+from c3bottles.model.location import Location
+from c3bottles.model.report import Report
+from c3bottles.model.visit import Visit
+
+
+max_hours = 24 * 366
+"""
+The maximum number of hours a single time series may span.
+"""
+
+unknown_level = -2 ** 31
+"""
+The level counted for drop points without a level.
+
+As NULL values never collide in a unique index, the key columns of the
+counts may not be NULL. -1 is a valid level, so the smallest 32 bit
+integer is used instead.
+"""
+
+
+class HourlyCount(db.Model):
+    """
+    The number of reports or visits within an hour.
+
+    Reports are counted per state and visits per action, both broken down
+    by the category and the level of the drop point at the time of the
+    report or visit. The counts are incremented in the same transaction
+    whenever a report or visit is added, so time series of any length can
+    be read from a few rows per hour instead of scanning all reports and
+    visits (see :meth:`timeseries()`).
+
+    If this table gets out of sync with the reports and visits (e.g. after
+    upgrading an existing database), it can be rebuilt by
+    :meth:`backfill()`.
+
+    Reports and visits of drop points without a level are counted on
+    :data:`unknown_level`.
+    """
+
+    __table_args__ = (
+        db.Index(
+            "ix_hourly_count_key", "hour", "kind", "value", "category_id", "level",
+            unique=True
+        ),
+    )
+
+    kinds = ("report", "visit")
+
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False)
+    kind = db.Column(db.Enum(*kinds, name="hourly_count_kinds"), nullable=False)
+    value = db.Column(db.String(32), nullable=False)
+    category_id = db.Column(db.Integer, nullable=False)
+    level = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, hour, kind, value, category_id, level, count=0):
+        self.hour = hour
+        self.kind = kind
+        self.value = value
+        self.category_id = category_id
+        self.level = level
+        self.count = count
+
+    @staticmethod
+    def key(obj, level):
+        """
+        Get the key of the row counting a report or visit.
+
+        :param obj: a :class:`Report` or :class:`Visit`
+        :param level: the level of the drop point at the time of `obj`
+        :return: a tuple (hour, kind, value, category_id, level)
+        """
+        if isinstance(obj, Report):
+            kind, value = "report", obj.state
+        else:
+            kind, value = "visit", obj.action
+        if level is None:
+            level = unknown_level
+        return floor_hour(obj.time), kind, value, obj.dp.category_id, level
+
+    @classmethod
+    def add(cls, counts):
+        """
+        Add to the counts of several rows.
+
+        Existing rows are incremented in the database, so concurrent
+        transactions do not overwrite each other's counts. On PostgreSQL,
+        every row is upserted by a single statement, so concurrent
+        transactions cannot insert the same row twice either. SQLite only
+        allows one writing transaction at a time anyway.
+
+        :param counts: a mapping of keys as returned by :meth:`key()` to
+            the number to add
+        """
+        rows = sorted(counts.items(), key=lambda i: repr(i[0]))
+
+        if db.engine.dialect.name == "postgresql":
+            table = cls.__table__
+            for (hour, kind, value, category_id, level), n in rows:
+                insert = postgresql.insert(table).values(
+                    hour=hour, kind=kind, value=value,
+                    category_id=category_id, level=level, count=n
+                )
+                db.session.execute(insert.on_conflict_do_update(
+                    index_elements=["hour", "kind", "value", "category_id", "level"],
+                    set_={"count": table.c.count + insert.excluded.count}
+                ))
+            return
+
+        for (hour, kind, value, category_id, level), n in rows:
+            updated = cls.query.filter(
+                cls.hour == hour,
+                cls.kind == kind,
+                cls.value == value,
+                cls.category_id == category_id,
+                cls.level == level
+            ).update({cls.count: cls.count + n}, synchronize_session=False)
+            if not updated:
+                db.session.add(cls(hour, kind, value, category_id, level, n))
+
+    @classmethod
+    def timeseries(cls, start=None, end=None, category_id=None, level=None):
+        """
+        Get the number of reports and visits per hour.
+
+        Only the counts of the hours in the requested range are read, so
+        this takes the same time for every hour no matter how many reports
+        and visits there are.
+
+        :param start: the start of the time range in seconds since the
+            epoch, 24 hours before `end` by default
+        :param end: the end of the time range in seconds since the epoch,
+            the current time by default
+        :param category_id: only count drop points of this category
+        :param level: only count drop points on this level
+        :return: a dict with the start of every hour in seconds since the
+            epoch and a list of counts in the same order for every report
+            state and visit action
+        :raises ValueError: If any of the parameters is invalid. The error
+            message will contain a tuple of dicts which indicate which
+            parameter is invalid.
+        """
+
+        errors = []
+
+        def parse_time(name, value, default):
+            if value is None:
+                return default
+            try:
+                return datetime.fromtimestamp(float(value))
+            except (TypeError, ValueError, OverflowError, OSError):
+                errors.append({name: lazy_gettext("Time is not a valid timestamp.")})
+
+        end = parse_time("end", end, datetime.today())
+        start = parse_time("start", start, end - timedelta(days=1) if end else None)
+
+        if category_id is not None:
+            try:
+                category_id = int(category_id)
+            except (TypeError, ValueError):
+                errors.append({"category": lazy_gettext("Category is not a number.")})
+
+        if level is not None:
+            try:
+                level = int(level)
+            except (TypeError, ValueError):
+                errors.append({"level": lazy_gettext("Level is not a number.")})
+
+        if start and end:
+            if start > end:
+                errors.append({"start": lazy_gettext("Start time after end time.")})
+            elif end - start > timedelta(hours=max_hours):
+                errors.append({"end": lazy_gettext("Time range is too long.")})
+
+        if errors:
+            raise ValueError(*errors)
+
+        hours = []
+        hour = floor_hour(start)
+        while hour <= end:
+            hours.append(hour)
+            hour += timedelta(hours=1)
+        index = {h: i for i, h in enumerate(hours)}
+
+        series = {
+            "report": {s: [0] * len(hours) for s in Report.states},
+            "visit": {a: [0] * len(hours) for a in Visit.actions},
+        }
+
+        query = db.session.query(
+            cls.hour, cls.kind, cls.value, func.sum(cls.count)
+        ).filter(cls.hour >= hours[0], cls.hour <= hours[-1])
+        if category_id is not None:
+            query = query.filter(cls.category_id == category_id)
+        if level is not None:
+            query = query.filter(cls.level == level)
+
+        for hour, kind, value, count in query.group_by(cls.hour, cls.kind, cls.value):
+            if value in series[kind] and hour in index:
+                series[kind][value][index[hour]] = int(count)
+
+        return {
+            "hours": [int(timestamp(h)) for h in hours],
+            "reports": series["report"],
+            "visits": series["visit"],
+        }
+
+    @classmethod
+    def backfill(cls):
+        """
+        Recount all reports and visits.
+
+        All rows are replaced by counts computed from all reports and
+        visits. The level of a drop point at the time of a report or
+        visit is taken from the location it had then.
+
+        :return: the number of rows written
+        """
+        levels = {}
+        for dp_id, time, level in db.session.query(
+                Location.dp_id, Location.time, Location.level
+        ).order_by(Location.dp_id, Location.time, Location.loc_id):
+            times, values = levels.setdefault(dp_id, ([], []))
+            times.append(time)
+            values.append(level)
+
+        def level_at(dp_id, time):
+            times, values = levels.get(dp_id, ([], [None]))
+            level = values[max(bisect_right(times, time) - 1, 0)]
+            return unknown_level if level is None else level
+
+        counts = Counter()
+        for model, column in ((Report, Report.state), (Visit, Visit.action)):
+            kind = "report" if model is Report else "visit"
+            for dp_id, time, value, category_id in db.session.query(
+                    model.dp_id, model.time, column, drop_point.DropPoint.category_id
+            ).join(drop_point.DropPoint).yield_per(1000):
+                counts[floor_hour(time), kind, value, category_id, level_at(dp_id, time)] += 1
+
+        cls.query.delete()
+        for (hour, kind, value, category_id, level), n in counts.items():
+            db.session.add(cls(hour, kind, value, category_id, level, n))
+        return len(counts)
+
+    def __repr__(self):
+        return "%s %s %s at %s (category %s, level %s)" % (
+            self.count, self.kind, self.value, self.hour, self.category_id, self.level
+        )
+
+
+def floor_hour(time):
+    """
+    Get the start of the hour a time lies within.
+    """
+    return time.replace(minute=0, second=0, microsecond=0)
+
+
+@event.listens_for(db.session, "before_flush")
+def count_hourly(session, flush_context, instances):
+    """
+    Count every report and visit added by a flush.
+    """
+    counts = Counter()
+    for obj in session.new:
+        if isinstance(obj, (Report, Visit)) and obj.dp is not None:
+            current = obj.dp.current
+            counts[HourlyCount.key(obj, current.level if current else None)] += 1
+    if counts:
+        # Every report and visit is logged as a change as well. Waiting for
+        # the change log first keeps concurrent transactions from locking
+        # the counts and the change log in opposite order.
+        DropPointChange.lock(session)
+        HourlyCount.add(counts)
+
+
+@app.cli.group("stats")
+def statistics_management():
+    """
+    Statistics management.
+
+    These commands allow maintenance of the statistics.
+    """
+
+
+@statistics_management.command("backfill")
+def backfill_hourly_counts():
+    """
+    Recounts the reports and visits per hour.
+
+    This has to be run once after upgrading an existing database and can
+    be used whenever the time series or the total numbers of reports and
+    visits seem to be out of sync with the reports and visits recorded.
+    """
+    rows = HourlyCount.backfill()
+    db.session.commit()
+    print("{} hourly counts written.".format(rows))
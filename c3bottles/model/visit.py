@@ -71,6 +71,7 @@ class Visit(db.Model):
             raise ValueError(*errors)
 
         db.session.add(self)
+        dp.current.add_visit(self)
 
     def __repr__(self):
         return "Visit %s of drop point %s (action %s at %s)" % (
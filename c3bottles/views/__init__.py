@@ -1,10 +1,10 @@
 from datetime import datetime
 from functools import wraps
 
-from flask import render_template, g, request, Response, get_flashed_messages, abort
+from flask import render_template, g, request, Response, get_flashed_messages, abort, session
 from flask_login import current_user
 
-from c3bottles import app
+from c3bottles import app, language_list
 from c3bottles.views.forms import LoginForm
 
 
@@ -55,6 +55,38 @@ def needs_admin(func):
     return decorated_view
 
 
+def revalidated(resp):
+    """
+    Let browsers and proxies cache a response which is the same for all
+    users, revalidating it via its ETag.
+
+    The locale of new visitors is written to their session before every
+    request, but a public response must never set a cookie, so that
+    change is not saved. It is made again on their next request.
+    """
+    session.modified = False
+    resp.cache_control.public = True
+    resp.cache_control.no_cache = True
+    resp.add_etag()
+    return resp.make_conditional(request)
+
+
+def page_js(lang, template, **context):
+    """
+    Respond with the JavaScript of a page rendered from a template.
+
+    The language is part of the URL and everything depending on the
+    current user is taken from the page itself, so the script is the same
+    for all users and can be cached by browsers and proxies.
+    """
+    if lang not in language_list:
+        abort(404)
+    return revalidated(Response(
+        render_template(template, lang=lang, **context),
+        mimetype="application/javascript"
+    ))
+
+
 @app.errorhandler(400)
 def bad_request(_):
     before_request()
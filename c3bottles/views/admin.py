@@ -1,15 +1,22 @@
-from flask import Blueprint, abort, render_template, flash, redirect, url_for, request
+from flask import Blueprint, abort, render_template, flash, redirect, url_for, request, \
+    make_response
 from flask_babel import lazy_gettext
 from flask_login import current_user
 
 from c3bottles import db, bcrypt
+from c3bottles.lib.bulk_import import error_messages, guess_format, import_drop_points, \
+    read_rows
+from c3bottles.model.category import categories_sorted
 from c3bottles.model.user import User, make_secure_token
 from c3bottles.views import not_found, unauthorized, needs_admin
-from c3bottles.views.forms import UserIdForm, PermissionsForm, PasswordForm, UserCreateForm
+from c3bottles.views.forms import UserIdForm, PermissionsForm, PasswordForm, UserCreateForm, \
+    ImportForm
 
 
 bp = Blueprint("admin", __name__, url_prefix="/admin")
 
+max_import_errors = 20
+
 
 @bp.before_request
 @needs_admin
@@ -34,9 +41,18 @@ def index():
         permissions_form=PermissionsForm(),
         password_form=PasswordForm(),
         user_create_form=UserCreateForm(),
+        import_form=ImportForm(),
+        categories=categories_sorted(),
     )
 
 
+@bp.route("/admin.js")
+def index_js():
+    resp = make_response(render_template("js/admin.js"))
+    resp.mimetype = "application/javascript"
+    return resp
+
+
 @bp.route("/disable_user", methods=("POST",))
 def disable_user():
     form = UserIdForm()
@@ -153,3 +169,32 @@ def create_user():
             "text": lazy_gettext("The new user has been created successfully.")
         })
         return redirect(url_for("admin.index"))
+
+
+@bp.route("/import_drop_points", methods=("POST",))
+def import_dps():
+    form = ImportForm()
+    if not form.validate_on_submit():
+        abort(400)
+    f = form.file.data
+    try:
+        count = import_drop_points(read_rows(f.read(), guess_format(f.filename)))
+    except ValueError as e:
+        db.session.rollback()
+        messages = list(error_messages(e.args))
+        for message in messages[:max_import_errors]:
+            flash({"class": "danger", "text": message})
+        if len(messages) > max_import_errors:
+            flash({
+                "class": "danger",
+                "text": lazy_gettext(
+                    "%(count)s more errors.", count=len(messages) - max_import_errors
+                )
+            })
+        return redirect(url_for("admin.index"))
+    db.session.commit()
+    flash({
+        "class": "success",
+        "text": lazy_gettext("%(count)s drop points have been imported.", count=count)
+    })
+    return redirect(url_for("admin.index"))
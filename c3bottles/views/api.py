@@ -1,17 +1,26 @@
 import json
+import zlib
 from datetime import datetime
+from time import time
 
-from flask import request, Response, Blueprint, jsonify
+from flask import request, Response, Blueprint, jsonify, stream_with_context, abort, \
+    render_template
 from flask_login import current_user
 
-from c3bottles import app, db
-from c3bottles.model.drop_point import DropPoint
+from c3bottles import app, db, language_list
+from c3bottles.lib.clustering import get_clusters
+from c3bottles.lib.tiles import get_tile
+from c3bottles.model.drop_point import DropPoint, fragment_fields, history_page_size
+from c3bottles.model.drop_point_change import DropPointChange
 from c3bottles.model.report import Report
 from c3bottles.model.visit import Visit
+from c3bottles.views import revalidated
 
 
 bp = Blueprint("api", __name__)
 
+COLUMNS_MIMETYPE = "application/vnd.c3bottles.columns+json"
+
 
 @bp.route("/api", methods=("POST", "GET"))
 def process():
@@ -37,6 +46,129 @@ def all_dp():
     return dp_json()
 
 
+@bp.route("/api/drop_points/<lang>.json")
+def drop_points(lang):
+    """
+    All drop points with the cursor of the data version they belong to.
+
+    The language is part of the URL and the time-dependent priority is
+    left out (clients compute it from the priority factor and base time),
+    so the response is the same for all users until any drop point
+    changes and can be revalidated cheaply via its ETag.
+    """
+    if lang not in language_list:
+        abort(404)
+    cursor = DropPointChange.get_cursor()
+    return revalidated(Response(
+        '{{"cursor": {}, "drop_points": {}}}'.format(
+            cursor, DropPoint.get_dps_json(fields=fragment_fields)
+        ),
+        mimetype="application/json"
+    ))
+
+
+@bp.route("/tiles/dp/<int(signed=True):level>/<int:z>/"
+          "<int(signed=True):x>/<int(signed=True):y>")
+def tile(level, z, x, y):
+    """
+    The active drop points on a map tile as a GeoJSON FeatureCollection.
+
+    Maps with a simple CRS are not limited to the tile range of the
+    world, so tile coordinates may be negative for them.
+    """
+    if not app.config.get("MAP_SOURCE"):
+        abort(404)
+    geojson = get_tile(level, z, x, y)
+    if geojson is None:
+        abort(404)
+    return revalidated(Response(geojson, mimetype="application/geo+json"))
+
+
+@bp.route("/api/queue")
+def queue():
+    try:
+        dps = DropPoint.get_queue(
+            limit=request.values.get("limit", 10),
+            category_id=request.values.get("category"),
+            level=request.values.get("level")
+        )
+    except ValueError as e:
+        return Response(
+            json.dumps(e.args, default=str, indent=4 if app.debug else None),
+            mimetype="application/json",
+            status=400
+        )
+    return Response(
+        json.dumps(dps, indent=4 if app.debug else None),
+        mimetype="application/json"
+    )
+
+
+@bp.route("/api/clusters.json")
+def clusters():
+    try:
+        ret = get_clusters(
+            request.values.get("zoom"),
+            level=request.values.get("level"),
+            bbox=request.values.get("bbox")
+        )
+    except ValueError as e:
+        return Response(
+            json.dumps(e.args, default=str, indent=4 if app.debug else None),
+            mimetype="application/json",
+            status=400
+        )
+    return Response(
+        json.dumps(ret, indent=4 if app.debug else None),
+        mimetype="application/json"
+    )
+
+
+@bp.route("/api/history/<int:number>")
+def history(number):
+    """
+    A page of the history of a drop point as table rows, for showing
+    older events on the details page.
+    """
+    dp = DropPoint.query.get_or_404(number)
+    try:
+        events, before = dp.get_history(
+            before=request.values.get("before"),
+            limit=history_page_size
+        )
+    except ValueError as e:
+        return Response(
+            json.dumps(e.args, default=str, indent=4 if app.debug else None),
+            mimetype="application/json",
+            status=400
+        )
+    return jsonify({
+        "html": render_template("view/history.html", history=events),
+        "before": before
+    })
+
+
+@bp.route("/api/stream")
+def stream():
+    cursor = request.headers.get("Last-Event-ID", request.values.get("cursor"))
+    try:
+        cursor = int(cursor)
+    except (TypeError, ValueError):
+        return Response(
+            json.dumps(
+                "Invalid or missing cursor.",
+                indent=4 if app.debug else None
+            ),
+            mimetype="application/json",
+            status=400
+        )
+    return Response(
+        stream_with_context(_events(cursor)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @bp.route("/api/map_source.json")
 def map_source():
     map_source = app.config.get('MAP_SOURCE', {})
@@ -118,21 +250,110 @@ def visit():
 
 def dp_json():
     ts = request.values.get("ts")
-    if ts:
+    cursor = request.values.get("cursor")
+    compact = request.values.get("format") == "columns" or (
+        request.accept_mimetypes.best_match(["application/json", COLUMNS_MIMETYPE])
+        == COLUMNS_MIMETYPE
+    )
+    if cursor:
         try:
-            dps = DropPoint.get_dps_json(
-                time=datetime.fromtimestamp(float(ts))
-            )
+            dps = DropPoint.get_changes_json(int(cursor))
         except ValueError as e:
             return Response(
                 json.dumps(e.args, indent=4 if app.debug else None),
                 mimetype="application/json",
                 status=400
             )
+    elif ts:
+        try:
+            dps = stream_with_context(DropPoint.iter_dps_json(
+                time=datetime.fromtimestamp(float(ts)),
+                fields=request.values.get("fields"),
+                compact=compact
+            ))
+        except ValueError as e:
+            return Response(
+                json.dumps(e.args, default=str, indent=4 if app.debug else None),
+                mimetype="application/json",
+                status=400
+            )
     else:
-        dps = DropPoint.get_dps_json()
+        try:
+            dps = stream_with_context(DropPoint.iter_dps_json(
+                fields=request.values.get("fields"),
+                compact=compact,
+                level=request.values.get("level"),
+                bbox=request.values.get("bbox"),
+                category_id=request.values.get("category"),
+                removed=request.values.get("removed"),
+                numbers=request.values.get("numbers")
+            ))
+        except ValueError as e:
+            return Response(
+                json.dumps(e.args, default=str, indent=4 if app.debug else None),
+                mimetype="application/json",
+                status=400
+            )
 
-    return Response(
-        dps,
-        mimetype="application/json"
+    if cursor:
+        return Response(dps, mimetype="application/json")
+    return _streamed(dps, COLUMNS_MIMETYPE if compact else "application/json")
+
+
+def _streamed(chunks, mimetype):
+    """
+    Stream a response, compressing it on the fly if the client accepts it.
+
+    Flask-Compress reads a whole response into memory before compressing
+    it, so streamed responses are compressed chunk by chunk here instead.
+    Flask-Compress leaves responses alone which already have a
+    Content-Encoding.
+    """
+    if "gzip" not in request.headers.get("Accept-Encoding", "").lower():
+        return Response(chunks, mimetype=mimetype)
+    resp = Response(_gzip(chunks), mimetype=mimetype)
+    resp.headers["Content-Encoding"] = "gzip"
+    resp.vary.add("Accept-Encoding")
+    return resp
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(
+        app.config.get("COMPRESS_LEVEL", 6), zlib.DEFLATED, 16 + zlib.MAX_WBITS
     )
+    for chunk in chunks:
+        # Flush every chunk, so clients can start parsing right away.
+        yield compressor.compress(chunk.encode("utf-8")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def _events(cursor):
+    """
+    Generate Server-Sent Events for all drop point changes after a cursor.
+
+    The changes are only looked up once :meth:`DropPointChange.wait()`
+    tells that there are any, which takes up to `STREAM_POLL_INTERVAL`
+    seconds for changes of other processes. Without changes, a keepalive
+    comment is sent at that interval. After `STREAM_TIMEOUT` seconds, the
+    stream ends and the browser reconnects with the id of the last event
+    as the new cursor.
+    """
+    interval = app.config.get("STREAM_POLL_INTERVAL", 5)
+    end = time() + app.config.get("STREAM_TIMEOUT", 300)
+    changed = True
+    while True:
+        dps = None
+        if changed:
+            dps, cursor = DropPoint.get_changes(cursor)
+            # Do not keep a database connection while waiting for changes.
+            db.session.remove()
+        if dps:
+            data = json.dumps(dps, indent=4 if app.debug else None)
+            yield "id: {}\nevent: drop_points\n{}\n".format(
+                cursor, "".join("data: {}\n".format(line) for line in data.splitlines())
+            )
+        else:
+            yield ": keepalive\n\n"
+        if time() >= end:
+            return
+        changed = DropPointChange.wait(cursor, interval)
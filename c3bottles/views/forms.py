@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired
 from wtforms.fields import StringField, PasswordField, HiddenField, IntegerField, BooleanField
 from wtforms.validators import DataRequired
 from wtforms.widgets import HiddenInput
@@ -32,3 +33,7 @@ class UserCreateForm(FlaskForm):
     can_visit = BooleanField("can_visit")
     can_edit = BooleanField("can_edit")
     is_admin = BooleanField("is_admin")
+
+
+class ImportForm(FlaskForm):
+    file = FileField("file", validators=[FileRequired()])
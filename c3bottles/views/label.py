@@ -1,12 +1,10 @@
-import qrcode
-from base64 import b64encode
-from cairosvg import svg2pdf
-from PyPDF2 import PdfFileWriter, PdfFileReader
-from io import BytesIO
+import json
 
-from flask import Blueprint, render_template, request, Response
+from flask import Blueprint, Response, request, abort, send_file, url_for
 
 from c3bottles import app
+from c3bottles.lib.export import LabelExport
+from c3bottles.lib.labels import create_pdf, label_key
 from c3bottles.model.drop_point import DropPoint
 from c3bottles.views import needs_visiting
 
@@ -18,27 +16,105 @@ bp = Blueprint("label", __name__)
 @needs_visiting
 def for_dp(number):
     DropPoint.query.get_or_404(number)
-    return Response(_create_pdf(number), mimetype="application/pdf")
+    return _pdf(label_key(number), lambda: create_pdf(number))
 
 
 @bp.route("/label/all.pdf")
 @needs_visiting
 def all_labels():
-    output = PdfFileWriter()
-    for dp in DropPoint.query.filter(DropPoint.removed == None).all():  # noqa
-        output.addPage(PdfFileReader(BytesIO(_create_pdf(dp.number))).getPage(0))
-    f = BytesIO()
-    output.write(f)
-    return Response(
-        f.getvalue(),
-        mimetype="application/pdf"
+    """
+    The labels of all active drop points as one PDF.
+
+    The PDF is never rendered here but by a label export, which is started
+    if there is none for the current labels. Until the export is done,
+    this responds like :func:`start_export()`.
+    """
+    job = LabelExport.start()
+    if job.state != "DONE":
+        return _export_started(job)
+    resp = send_file(job.path, mimetype="application/pdf", cache_timeout=0)
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.set_etag(job.id)
+    return resp.make_conditional(request)
+
+
+@bp.route("/label/export", methods=("POST",))
+@needs_visiting
+def start_export():
+    """
+    Start exporting the labels of the active drop points matching the
+    filters given in the background.
+    """
+    try:
+        job = LabelExport.start(
+            level=request.values.get("level"),
+            category_id=request.values.get("category"),
+            first=request.values.get("first"),
+            last=request.values.get("last"),
+            numbers=request.values.get("numbers")
+        )
+    except ValueError as e:
+        return Response(
+            json.dumps(e.args, default=str, indent=4 if app.debug else None),
+            mimetype="application/json",
+            status=400
+        )
+    return _export_started(job)
+
+
+@bp.route("/label/export/<job_id>")
+@needs_visiting
+def export_status(job_id):
+    job = LabelExport.get(job_id)
+    if job is None:
+        abort(404)
+    return _export_status(job)
+
+
+@bp.route("/label/export/<job_id>.pdf")
+@needs_visiting
+def export_download(job_id):
+    job = LabelExport.get(job_id)
+    if job is None or job.state != "DONE":
+        abort(404)
+    return send_file(job.path, mimetype="application/pdf", as_attachment=True,
+                     attachment_filename="labels.pdf")
+
+
+def _export_started(job):
+    resp = _export_status(job)
+    resp.status_code = 202
+    resp.headers["Location"] = url_for("label.export_status", job_id=job.id)
+    return resp
+
+
+def _export_status(job):
+    ret = {"id": job.id, "state": job.state, "done": job.done, "total": job.total}
+    if job.state == "DONE":
+        ret["download"] = url_for("label.export_download", job_id=job.id)
+    resp = Response(
+        json.dumps(ret, indent=4 if app.debug else None),
+        mimetype="application/json"
     )
+    resp.cache_control.no_store = True
+    return resp
+
 
+def _pdf(etag, create):
+    """
+    Respond with a PDF identified by an ETag.
 
-def _create_pdf(number):
-    img = qrcode.make(request.url_root + str(number))
-    f = BytesIO()
-    img.save(f)
-    b64 = b64encode(f.getvalue()).decode("utf-8")
-    label_style = app.config.get("LABEL_STYLE", "default")
-    return svg2pdf(render_template("label/{}.svg".format(label_style), number=number, qr=b64))
+    As the ETag changes whenever the PDF does, the PDF is only created if
+    the client does not have the current version already.
+    """
+    resp = Response(mimetype="application/pdf")
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.set_etag(etag)
+    if request.if_none_match.contains(etag):
+        resp.status_code = 304
+    else:
+        resp.set_data(create())
+    return resp
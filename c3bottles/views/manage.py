@@ -1,13 +1,13 @@
 from datetime import datetime
 
-from flask import Blueprint, render_template, request, make_response, url_for, flash, redirect
+from flask import Blueprint, render_template, request, url_for, flash, redirect
 from flask_babel import lazy_gettext
 
 from c3bottles import db
 from c3bottles.model.category import categories_sorted
 from c3bottles.model.drop_point import DropPoint
 from c3bottles.model.location import Location
-from c3bottles.views import needs_editing
+from c3bottles.views import needs_editing, page_js
 
 
 bp = Blueprint("manage", __name__)
@@ -63,17 +63,9 @@ def create(lat=None, lng=None, level=None, description=None, errors=None):
     )
 
 
-@bp.route("/create.js/<level>/<float:lat>/<float:lng>")
-def create_js(level, lat, lng):
-    resp = make_response(render_template(
-        "js/create.js",
-        all_dps_json=DropPoint.get_dps_json(),
-        level=int(level),
-        lat=lat,
-        lng=lng
-    ))
-    resp.mimetype = "application/javascript"
-    return resp
+@bp.route("/create.js/<lang>/<level>/<float:lat>/<float:lng>")
+def create_js(lang, level, lat, lng):
+    return page_js(lang, "js/create.js", level=int(level), lat=lat, lng=lng)
 
 
 @bp.route("/edit/<string:number>", methods=("GET", "POST"))
@@ -153,12 +145,6 @@ def edit(number=None, errors=None):
     )
 
 
-@bp.route("/edit.js/<string:number>")
-def edit_js(number):
-    resp = make_response(render_template(
-        "js/edit.js",
-        all_dps_json=DropPoint.get_dps_json(),
-        dp=DropPoint.query.get_or_404(number),
-    ))
-    resp.mimetype = "application/javascript"
-    return resp
+@bp.route("/edit.js/<lang>/<string:number>")
+def edit_js(lang, number):
+    return page_js(lang, "js/edit.js", dp=DropPoint.query.get_or_404(number))
@@ -1,6 +1,10 @@
-from flask import render_template, Blueprint, make_response, jsonify
+import json
 
+from flask import render_template, Blueprint, make_response, jsonify, request, Response
+
+from c3bottles import app
 from c3bottles.lib.statistics import stats_obj
+from c3bottles.model.hourly_count import HourlyCount
 
 
 bp = Blueprint("statistics", __name__)
@@ -22,6 +26,27 @@ def numbers_json():
     })
 
 
+@bp.route("/numbers/timeseries.json")
+def timeseries_json():
+    try:
+        ret = HourlyCount.timeseries(
+            start=request.values.get("start"),
+            end=request.values.get("end"),
+            category_id=request.values.get("category"),
+            level=request.values.get("level")
+        )
+    except ValueError as e:
+        return Response(
+            json.dumps(e.args, default=str, indent=4 if app.debug else None),
+            mimetype="application/json",
+            status=400
+        )
+    return Response(
+        json.dumps(ret, indent=4 if app.debug else None),
+        mimetype="application/json"
+    )
+
+
 @bp.route("/numbers.js")
 def numbers_js():
     resp = make_response(render_template(
@@ -1,9 +1,10 @@
-from flask import Blueprint, make_response, render_template, abort
+from flask import Blueprint, render_template, abort
 
 from c3bottles import app
 from c3bottles.lib.statistics import stats_obj
 from c3bottles.model.category import categories_sorted
-from c3bottles.model.drop_point import DropPoint
+from c3bottles.model.drop_point import DropPoint, history_page_size
+from c3bottles.views import page_js
 
 
 bp = Blueprint("view", __name__)
@@ -18,14 +19,9 @@ def list_():
     )
 
 
-@bp.route("/list.js")
-def list_js():
-    resp = make_response(render_template(
-        "js/list.js",
-        all_dps_json=DropPoint.get_dps_json()
-    ))
-    resp.mimetype = "application/javascript"
-    return resp
+@bp.route("/list.js/<lang>")
+def list_js(lang):
+    return page_js(lang, "js/list.js")
 
 
 @bp.route("/map")
@@ -39,29 +35,24 @@ def map_():
     )
 
 
-@bp.route("/map.js")
-def map_js():
-    resp = make_response(render_template(
-        "js/map.js",
-        all_dps_json=DropPoint.get_dps_json()
-    ))
-    resp.mimetype = "application/javascript"
-    return resp
+@bp.route("/map.js/<lang>")
+def map_js(lang):
+    return page_js(lang, "js/map.js")
 
 
 @bp.route("/details")  # This seems useless but we need this for dynamic URL building
 @bp.route("/details/<int:number>")
 def details(number=None):
     dp = DropPoint.query.get_or_404(number)
-    return render_template("view/details.html", dp=dp)
+    history, before = dp.get_history(limit=history_page_size)
+    return render_template(
+        "view/details.html",
+        dp=dp,
+        history=history,
+        history_before=before
+    )
 
 
-@bp.route("/details.js/<int:number>")
-def details_js(number):
-    resp = make_response(render_template(
-        "js/details.js",
-        all_dps_json=DropPoint.get_dps_json(),
-        dp=DropPoint.query.get_or_404(number),
-    ))
-    resp.mimetype = "application/javascript"
-    return resp
+@bp.route("/details.js/<lang>/<int:number>")
+def details_js(lang, number):
+    return page_js(lang, "js/details.js", dp=DropPoint.query.get_or_404(number))
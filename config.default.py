@@ -27,12 +27,58 @@
 # i.e. without extension.
 # LABEL_STYLE = "default"
 
-# Enable and configure the integrated Prometheus endpoint.
+# The number of processes rendering the labels of many drop points in parallel
+# when exporting them. The PDF is then drawn from the rendered labels by the
+# export process in a single pass. With a setting of 1, the export process
+# renders the labels itself. (default: 1)
+# LABEL_WORKERS = 4
+
+# Rendered labels are cached on disk, one SVG per drop point, until the cache
+# exceeds the given size in bytes. The cache can be filled before the event
+# with `./manage.py label prewarm https://example.org/`. A size of 0 disables
+# the cache and the parallel rendering of labels.
+# (default: a directory in the system's temporary directory, 256 MiB)
+# LABEL_CACHE_DIR = "/var/cache/c3bottles/labels"
+# LABEL_CACHE_SIZE = 256 * 1024 * 1024
+
+# Exports of the labels of many drop points are run one after another by
+# separate background processes, so they never block a web server worker. They
+# are written to this directory, where they are kept for the given number of
+# seconds. (default: a directory in the system's temporary directory, 1 day)
+# LABEL_EXPORT_DIR = "/var/cache/c3bottles/exports"
+# LABEL_EXPORT_MAX_AGE = 24 * 60 * 60
+
+# Enable and configure the integrated Prometheus endpoint. With several
+# Gunicorn workers, see the Prometheus section in doc/INSTALL.md.
 # (default: False)
 # PROMETHEUS_ENABLED = True
 # PROMETHEUS_ADDRESS = "127.0.0.1"
 # PROMETHEUS_PORT = 9567
 
+# With the Prometheus endpoint enabled, the number of SQL queries and the time
+# spent in the database are recorded per request. Requests issuing more queries
+# than this budget are logged with the fingerprints of their queries. A setting
+# of 0 disables the log messages. (default: 50)
+# SQL_QUERY_BUDGET = 50
+
+# Open map and list views receive drop point updates as Server-Sent Events.
+# Changes made by other worker processes are picked up every
+# STREAM_POLL_INTERVAL seconds, and browsers reconnect after STREAM_TIMEOUT
+# seconds. Streams are held open for a long time, so run Gunicorn with an
+# asynchronous worker class like gevent. (default: 5 and 300 seconds)
+# STREAM_POLL_INTERVAL = 5
+# STREAM_TIMEOUT = 300
+
+# Data derived from all drop points, e.g. the JSON representation of all drop
+# points, is cached in every process until any drop point changes or the
+# maximum age has been reached. A setting of 0 disables caching.
+# (default: 60 seconds)
+# CACHE_MAX_AGE = 60
+
+# The maximum number of drop points returned by /api/queue in one request.
+# (default: 100)
+# QUEUE_MAX_LIMIT = 100
+
 # Mark the session and remember cookies as secure. You should enable this if
 # you run c3bottles on a HTTPS server.
 # SESSION_COOKIE_SECURE = True
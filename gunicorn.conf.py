@@ -0,0 +1,50 @@
+"""
+Gunicorn configuration for c3bottles.
+
+If the environment variable `prometheus_multiproc_dir` points to a writable
+directory, all worker processes write their Prometheus metrics to that
+directory and a separate process started by the Gunicorn master serves the
+metrics of all workers together (see `./manage.py metrics`). The directory
+is emptied on every start.
+
+With the gevent worker class, psycopg2 is made to wait for the database
+cooperatively, so queries do not block the other requests of a worker.
+"""
+import os
+import subprocess
+import sys
+
+multiproc_dir = os.environ.get("prometheus_multiproc_dir")
+
+
+def on_starting(server):
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for name in os.listdir(multiproc_dir):
+            if name.endswith(".db"):
+                os.remove(os.path.join(multiproc_dir, name))
+
+
+def when_ready(server):
+    if multiproc_dir:
+        server.metrics_exporter = subprocess.Popen([
+            sys.executable, os.path.join(os.path.dirname(__file__), "manage.py"), "metrics"
+        ])
+
+
+def post_fork(server, worker):
+    if "gevent" in server.cfg.worker_class_str:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+
+def child_exit(server, worker):
+    if multiproc_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    exporter = getattr(server, "metrics_exporter", None)
+    if exporter is not None:
+        exporter.terminate()
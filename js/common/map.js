@@ -112,6 +112,8 @@ function redrawMarkers() {
   }
 }
 
+module.exports.redrawMarkers = redrawMarkers;
+
 module.exports.getCategory = function() {
   return mapCategory;
 };
@@ -2,25 +2,41 @@ const $ = require('jquery');
 
 const refreshInterval = 30000;
 
-function update(ts) {
-  const _ts = Date.now() / 1000;
+function refresh(dps) {
+  drop_points = drop_points || [];
+  $.extend(true, drop_points, dps);
+  for (const num in dps) {
+    global.refreshDropPoint(num);
+  }
+}
 
+function update(cursor) {
   $.post('/api/all_dp.json', {
-    ts,
+    cursor,
   }).then(response => {
-    drop_points = drop_points || [];
-    $.extend(true, drop_points, response);
-    for (const num in response) {
-      global.refreshDropPoint(num);
-    }
+    refresh(response.drop_points);
     setTimeout(() => {
-      update(_ts);
+      update(response.cursor);
     }, refreshInterval);
   });
 }
 
-const ts = Date.now() / 1000;
+function listen(cursor) {
+  // The browser reconnects on its own and sends the id of the last
+  // event received, which the server prefers over the cursor given here.
+  const source = new EventSource(`/api/stream?cursor=${cursor}`);
+
+  source.addEventListener('drop_points', e => {
+    refresh(JSON.parse(e.data));
+  });
+}
 
-setTimeout(() => {
-  update(ts);
-}, refreshInterval);
+module.exports.start = function(cursor) {
+  if (window.EventSource) {
+    listen(cursor);
+  } else {
+    setTimeout(() => {
+      update(cursor);
+    }, refreshInterval);
+  }
+};
@@ -3,7 +3,7 @@ import '@babel/polyfill';
 global.create = require('../common/create');
 global.map = require('../common/map');
 global.list = require('../common/list');
+global.refresh = require('../common/refresh');
 
-require('../common/refresh');
 require('../common/admin');
 require('../common/main');
@@ -89,5 +89,20 @@ def profile(host, port):
     app.run(debug=True, host=host, port=port)
 
 
+@app.cli.command()
+def metrics():
+    """
+    Serves the Prometheus metrics of all worker processes.
+
+    This is started by the Gunicorn configuration if the metrics of
+    several workers are collected in `prometheus_multiproc_dir`.
+    """
+    if not app.config.get("PROMETHEUS_ENABLED", False):
+        print("The Prometheus exporter is not enabled.")
+        return
+    from c3bottles.lib.metrics import serve
+    serve()
+
+
 if __name__ == '__main__':
     cli()
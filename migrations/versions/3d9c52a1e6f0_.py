@@ -0,0 +1,23 @@
+"""add position index to drop point state
+
+Revision ID: 3d9c52a1e6f0
+Revises: c81f0e2b7d4a
+Create Date: 2019-08-11 18:05:31.227514
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3d9c52a1e6f0'
+down_revision = 'c81f0e2b7d4a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_drop_point_state_position', 'drop_point_state', ['level', 'lat', 'lng'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_drop_point_state_position', table_name='drop_point_state')
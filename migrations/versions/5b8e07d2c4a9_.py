@@ -0,0 +1,35 @@
+"""add hourly counts of reports and visits
+
+Revision ID: 5b8e07d2c4a9
+Revises: 3d9c52a1e6f0
+Create Date: 2019-08-12 10:21:47.903114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e07d2c4a9'
+down_revision = '3d9c52a1e6f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('hourly_count',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.DateTime(), nullable=False),
+    sa.Column('kind', sa.Enum('report', 'visit', name='hourly_count_kinds'), nullable=False),
+    sa.Column('value', sa.String(length=32), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('level', sa.Integer(), nullable=True),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_hourly_count_key', 'hourly_count', ['hour', 'kind', 'value', 'category_id', 'level'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_hourly_count_key', table_name='hourly_count')
+    op.drop_table('hourly_count')
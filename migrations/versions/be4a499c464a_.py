@@ -0,0 +1,30 @@
+"""add drop point change log
+
+Revision ID: be4a499c464a
+Revises: f5a7213d87ac
+Create Date: 2019-08-11 11:47:30.312865
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'be4a499c464a'
+down_revision = 'f5a7213d87ac'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('drop_point_change',
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('dp_id', sa.Integer(), nullable=False),
+    sa.Column('time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['dp_id'], ['drop_point.number'], ),
+    sa.PrimaryKeyConstraint('seq')
+    )
+
+
+def downgrade():
+    op.drop_table('drop_point_change')
@@ -0,0 +1,29 @@
+"""add priority base time to drop point state
+
+The base times of existing drop points are filled in by revision
+d1f4a7c2e8b3.
+
+Revision ID: c81f0e2b7d4a
+Revises: be4a499c464a
+Create Date: 2019-08-11 14:22:47.391026
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f0e2b7d4a'
+down_revision = 'be4a499c464a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('drop_point_state', sa.Column('priority_base', sa.Float(), nullable=True))
+    op.create_index(op.f('ix_drop_point_state_priority_base'), 'drop_point_state', ['priority_base'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_drop_point_state_priority_base'), table_name='drop_point_state')
+    op.drop_column('drop_point_state', 'priority_base')
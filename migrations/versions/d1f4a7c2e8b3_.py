@@ -0,0 +1,162 @@
+"""fill in the state of existing drop points
+
+Creates the missing state rows of drop points which existed before the
+drop_point_state table was added and fills in missing priority base
+times, so no drop point is left without a current state after upgrading.
+
+Revision ID: d1f4a7c2e8b3
+Revises: 5b8e07d2c4a9
+Create Date: 2019-08-13 09:41:12.508317
+
+"""
+from time import mktime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1f4a7c2e8b3'
+down_revision = '5b8e07d2c4a9'
+branch_labels = None
+depends_on = None
+
+# The report weights at the time of this migration.
+state_weights = {
+    'DEFAULT': 5.0,
+    'NEW': 1.0,
+    'NO_CRATES': 5.0,
+    'SOME_BOTTLES': 1.0,
+    'REASONABLY_FULL': 2.0,
+    'FULL': 3.0,
+    'OVERFLOW': 5.0,
+    'EMPTY': 0.0,
+}
+
+drop_point = sa.table(
+    'drop_point',
+    sa.column('number'), sa.column('time', sa.DateTime),
+)
+location = sa.table(
+    'location',
+    sa.column('loc_id'), sa.column('dp_id'), sa.column('time', sa.DateTime),
+    sa.column('description'), sa.column('lat'), sa.column('lng'), sa.column('level'),
+)
+report = sa.table(
+    'report',
+    sa.column('rep_id'), sa.column('dp_id'), sa.column('time', sa.DateTime), sa.column('state'),
+)
+visit = sa.table(
+    'visit',
+    sa.column('vis_id'), sa.column('dp_id'), sa.column('time', sa.DateTime), sa.column('action'),
+)
+drop_point_state = sa.table(
+    'drop_point_state',
+    sa.column('dp_id'), sa.column('loc_id'), sa.column('location_time', sa.DateTime),
+    sa.column('description'), sa.column('lat'), sa.column('lng'), sa.column('level'),
+    sa.column('last_report_id'), sa.column('last_report_time', sa.DateTime), sa.column('last_report_state'),
+    sa.column('last_visit_id'), sa.column('last_visit_time', sa.DateTime), sa.column('last_visit_action'),
+    sa.column('last_emptied_time', sa.DateTime), sa.column('last_state'),
+    sa.column('total_report_count'), sa.column('new_report_count'),
+    sa.column('report_weight_sum'), sa.column('priority_base'),
+)
+
+
+def timestamp(time):
+    return mktime(time.timetuple()) + time.microsecond / 1e6
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    existing = {dp_id: base for dp_id, base in conn.execute(
+        sa.select([drop_point_state.c.dp_id, drop_point_state.c.priority_base])
+    )}
+    missing = {number: time for number, time in conn.execute(
+        sa.select([drop_point.c.number, drop_point.c.time])
+    ) if number not in existing or existing[number] is None}
+
+    if not missing:
+        return
+
+    # Ordered by time and id, the last row of every drop point is the
+    # one the state refers to, just like in DropPointState.rebuild().
+    locations = {}
+    for row in conn.execute(location.select().order_by(
+            location.c.dp_id, location.c.time, location.c.loc_id)):
+        locations[row.dp_id] = row
+
+    visits = {}
+    emptied = {}
+    for row in conn.execute(visit.select().order_by(
+            visit.c.dp_id, visit.c.time, visit.c.vis_id)):
+        visits[row.dp_id] = row
+        if row.action == 'EMPTIED':
+            emptied[row.dp_id] = row.time
+
+    reports = {}
+    report_counts = {}
+    dp_reports = {}
+    for row in conn.execute(report.select().order_by(
+            report.c.dp_id, report.c.time, report.c.rep_id)):
+        reports[row.dp_id] = row
+        report_counts[row.dp_id] = report_counts.get(row.dp_id, 0) + 1
+        dp_reports.setdefault(row.dp_id, []).append(row)
+
+    for number, time in missing.items():
+        loc = locations.get(number)
+        rep = reports.get(number)
+        vis = visits.get(number)
+
+        new_reports = [
+            r for r in dp_reports.get(number, [])
+            if vis is None or r.time > vis.time
+        ]
+        weight_sum = 0.0
+        for r in new_reports:
+            weight_sum = state_weights.get(r.state, state_weights['DEFAULT']) + weight_sum / 2
+
+        if rep is not None:
+            if emptied.get(number) is not None and emptied[number] > rep.time:
+                last_state = 'EMPTY'
+            else:
+                last_state = rep.state
+        elif vis is not None and vis.action == 'EMPTIED':
+            last_state = 'EMPTY'
+        else:
+            last_state = 'NEW'
+
+        base = vis.time if vis is not None else time
+        priority_base = timestamp(base) if base is not None else None
+
+        if number in existing:
+            conn.execute(drop_point_state.update().where(
+                drop_point_state.c.dp_id == number
+            ).values(priority_base=priority_base))
+            continue
+
+        conn.execute(drop_point_state.insert().values(
+            dp_id=number,
+            loc_id=loc.loc_id if loc else None,
+            location_time=loc.time if loc else None,
+            description=loc.description if loc else None,
+            lat=loc.lat if loc else None,
+            lng=loc.lng if loc else None,
+            level=loc.level if loc else None,
+            last_report_id=rep.rep_id if rep else None,
+            last_report_time=rep.time if rep else None,
+            last_report_state=rep.state if rep else None,
+            last_visit_id=vis.vis_id if vis else None,
+            last_visit_time=vis.time if vis else None,
+            last_visit_action=vis.action if vis else None,
+            last_emptied_time=emptied.get(number),
+            last_state=last_state,
+            total_report_count=report_counts.get(number, 0),
+            new_report_count=len(new_reports),
+            report_weight_sum=weight_sum,
+            priority_base=priority_base,
+        ))
+
+
+def downgrade():
+    pass
@@ -0,0 +1,27 @@
+"""drop the priority base index
+
+The queue ranks drop points by an expression of the priority base time,
+which the index on the base time alone cannot serve.
+
+Revision ID: e6b3c9f1a2d5
+Revises: d1f4a7c2e8b3
+Create Date: 2019-08-13 11:02:35.174690
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6b3c9f1a2d5'
+down_revision = 'd1f4a7c2e8b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('ix_drop_point_state_priority_base', table_name='drop_point_state')
+
+
+def downgrade():
+    op.create_index('ix_drop_point_state_priority_base', 'drop_point_state', ['priority_base'], unique=False)
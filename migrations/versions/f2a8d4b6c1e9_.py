@@ -0,0 +1,68 @@
+"""make the keys of the hourly counts not nullable
+
+NULL values never collide in the unique index of the counts, so counts of
+drop points without a level are stored on the smallest 32 bit integer.
+Rows which differed only by NULL values are merged.
+
+Revision ID: f2a8d4b6c1e9
+Revises: e6b3c9f1a2d5
+Create Date: 2019-08-13 14:27:08.640215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8d4b6c1e9'
+down_revision = 'e6b3c9f1a2d5'
+branch_labels = None
+depends_on = None
+
+unknown_level = -2 ** 31
+
+hourly_count = sa.table(
+    'hourly_count',
+    sa.column('hour', sa.DateTime), sa.column('kind'), sa.column('value'),
+    sa.column('category_id'), sa.column('level'), sa.column('count'),
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+    c = hourly_count.c
+    has_null = sa.or_(c.category_id == None, c.level == None)  # noqa
+
+    rows = conn.execute(sa.select([
+        c.hour, c.kind, c.value,
+        sa.func.coalesce(c.category_id, 0),
+        sa.func.coalesce(c.level, unknown_level),
+        sa.func.sum(c.count),
+    ]).where(has_null).group_by(
+        c.hour, c.kind, c.value,
+        sa.func.coalesce(c.category_id, 0),
+        sa.func.coalesce(c.level, unknown_level),
+    )).fetchall()
+
+    conn.execute(hourly_count.delete().where(has_null))
+    for hour, kind, value, category_id, level, count in rows:
+        updated = conn.execute(hourly_count.update().where(sa.and_(
+            c.hour == hour, c.kind == kind, c.value == value,
+            c.category_id == category_id, c.level == level
+        )).values(count=c.count + count)).rowcount
+        if not updated:
+            conn.execute(hourly_count.insert().values(
+                hour=hour, kind=kind, value=value,
+                category_id=category_id, level=level, count=count
+            ))
+
+    op.alter_column('hourly_count', 'category_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('hourly_count', 'level', existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade():
+    op.alter_column('hourly_count', 'level', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('hourly_count', 'category_id', existing_type=sa.Integer(), nullable=True)
+    op.execute(hourly_count.update().where(
+        hourly_count.c.level == unknown_level
+    ).values(level=None))
@@ -0,0 +1,27 @@
+"""add report weight sum to drop point state
+
+Run `./manage.py dp rebuild` after the upgrade to fill in the sums for
+drop points that have been reported since their last visit.
+
+Revision ID: f5a7213d87ac
+Revises: ff722355df08
+Create Date: 2019-08-10 17:03:12.584102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a7213d87ac'
+down_revision = 'ff722355df08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('drop_point_state', sa.Column('report_weight_sum', sa.Float(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('drop_point_state', 'report_weight_sum')
@@ -0,0 +1,54 @@
+"""add drop point state
+
+The state table is created empty. It is filled from the existing
+locations, reports and visits by revision d1f4a7c2e8b3.
+
+Revision ID: ff722355df08
+Revises: 7396aea8eb0a
+Create Date: 2019-08-10 14:12:41.215377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'ff722355df08'
+down_revision = '7396aea8eb0a'
+branch_labels = None
+depends_on = None
+
+report_states = postgresql.ENUM('DEFAULT', 'NEW', 'NO_CRATES', 'SOME_BOTTLES', 'REASONABLY_FULL', 'FULL', 'OVERFLOW', 'EMPTY', name='report_states', create_type=False)
+visit_actions = postgresql.ENUM('EMPTIED', 'ADDED_CRATE', 'REMOVED_CRATE', 'RELOCATED', 'REMOVED', 'NO_ACTION', name='visit_actions', create_type=False)
+
+
+def upgrade():
+    op.create_table('drop_point_state',
+    sa.Column('dp_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('loc_id', sa.Integer(), nullable=True),
+    sa.Column('location_time', sa.DateTime(), nullable=True),
+    sa.Column('description', sa.String(length=140), nullable=True),
+    sa.Column('lat', sa.Float(), nullable=True),
+    sa.Column('lng', sa.Float(), nullable=True),
+    sa.Column('level', sa.Integer(), nullable=True),
+    sa.Column('last_report_id', sa.Integer(), nullable=True),
+    sa.Column('last_report_time', sa.DateTime(), nullable=True),
+    sa.Column('last_report_state', report_states, nullable=True),
+    sa.Column('last_visit_id', sa.Integer(), nullable=True),
+    sa.Column('last_visit_time', sa.DateTime(), nullable=True),
+    sa.Column('last_visit_action', visit_actions, nullable=True),
+    sa.Column('last_emptied_time', sa.DateTime(), nullable=True),
+    sa.Column('last_state', report_states, nullable=False),
+    sa.Column('total_report_count', sa.Integer(), nullable=False),
+    sa.Column('new_report_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['dp_id'], ['drop_point.number'], ),
+    sa.ForeignKeyConstraint(['loc_id'], ['location.loc_id'], ),
+    sa.ForeignKeyConstraint(['last_report_id'], ['report.rep_id'], ),
+    sa.ForeignKeyConstraint(['last_visit_id'], ['visit.vis_id'], ),
+    sa.PrimaryKeyConstraint('dp_id')
+    )
+
+
+def downgrade():
+    op.drop_table('drop_point_state')
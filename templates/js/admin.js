@@ -0,0 +1,44 @@
+function pollExport(url) {
+    $.getJSON(url, function(job) {
+        var percent = job.total ? Math.round(100 * job.done / job.total) : 100;
+        $("#admin-export-labels-progress .progress-bar").css("width", percent + "%");
+        if (job.state === "DONE") {
+            $("#admin-export-labels-progress").prop("hidden", true);
+            $("#admin-button-download-labels").attr("href", job.download).prop("hidden", false);
+        } else if (job.state === "FAILED") {
+            $("#admin-export-labels-progress").prop("hidden", true);
+            $("#admin-export-labels-error").prop("hidden", false);
+        } else {
+            setTimeout(function() { pollExport(url); }, 1000);
+        }
+    });
+}
+
+function startExport(filters) {
+    $("#admin-button-download-labels").prop("hidden", true);
+    $("#admin-export-labels-error").prop("hidden", true);
+    $("#admin-export-labels-progress .progress-bar").css("width", "0%");
+    $("#admin-export-labels-progress").prop("hidden", false);
+    $.post("{{ url_for('label.start_export') }}", filters, function(data, status, xhr) {
+        pollExport(xhr.getResponseHeader("Location"));
+    }).fail(function() {
+        $("#admin-export-labels-progress").prop("hidden", true);
+        $("#admin-export-labels-error").prop("hidden", false);
+    });
+}
+
+$("#admin-button-create-all-labels").click(function(e) {
+    e.preventDefault();
+    startExport({});
+});
+
+$("#admin-form-export-labels").submit(function(e) {
+    e.preventDefault();
+    var filters = {};
+    $.each($(this).serializeArray(), function(i, field) {
+        if (field.value !== "") {
+            filters[field.name] = field.value;
+        }
+    });
+    startExport(filters);
+});
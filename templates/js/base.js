@@ -14,4 +14,12 @@ var mapSource = {
     no_wrap: {{ map_source.get("no_wrap", false)|lower }},
 };
 
-var drop_points = {{ all_dps_json|safe }};
+var drop_points = {};
+
+function loadDropPoints(callback) {
+    $.getJSON("{{ url_for('api.drop_points', lang=lang) }}", function(data) {
+        $.extend(drop_points, data.drop_points);
+        callback();
+        refresh.start(data.cursor);
+    });
+}
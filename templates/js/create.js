@@ -11,3 +11,5 @@ create.drawNewDp({{ lat }}, {{ lng }});
 if (!$(".alert-danger").length) {
     create.setInfoFromMarker({"lat": {{ lat }}, "lng": {{ lng }}});
 }
+
+loadDropPoints(map.redrawMarkers);
@@ -4,3 +4,19 @@ var mapObj = map.initializeMap(mapSource);
 
 mapObj.setView([{{ dp.lat }}, {{ dp.lng }}], 3);
 map.setLevel({{ dp.level }});
+
+loadDropPoints(map.redrawMarkers);
+
+$("#history_more").click(function() {
+    var button = $(this);
+    $.getJSON("{{ url_for('api.history', number=dp.number) }}", {
+        before: button.data("before")
+    }, function(data) {
+        $("#history").append(data.html);
+        if (data.before) {
+            button.data("before", data.before);
+        } else {
+            button.remove();
+        }
+    });
+});
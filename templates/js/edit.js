@@ -10,3 +10,5 @@ mapObj.setView([{{ dp.lat }}, {{ dp.lng }}], 3);
 map.setLevel({{ dp.level }});
 
 create.drawNewDp({{ dp.lat }}, {{ dp.lng }});
+
+loadDropPoints(map.redrawMarkers);
@@ -34,6 +34,8 @@ mapObj.on("zoomend", updateHash);
 
 var pane_on_click = "report";
 
-{% if current_user.can_edit: %}
-map.allowDpCreation();
-{% endif %}
+if ($("#map").data("can-edit")) {
+    map.allowDpCreation();
+}
+
+loadDropPoints(map.redrawMarkers);
@@ -13,6 +13,8 @@ def load_config():
     app.config['TESTING'] = True
     app.config['WTF_CSRF_ENABLED'] = False
     app.config['SECRET_KEY'] = 'secret'
+    # Every test starts with a fresh database, so data versions repeat.
+    app.config['CACHE_MAX_AGE'] = 0
 
 
 class C3BottlesTestCase(unittest.TestCase):
@@ -0,0 +1,122 @@
+import json
+from io import BytesIO
+
+from c3bottles import db
+from c3bottles.lib.bulk_import import error_messages, guess_format, import_drop_points, \
+    read_rows
+from c3bottles.model.drop_point import DropPoint
+from c3bottles.model.drop_point_change import DropPointChange
+from c3bottles.model.report import Report
+from c3bottles.views.user import User
+
+from . import C3BottlesTestCase, NAME, PASSWORD
+
+
+CSV = """number,category_id,description,lat,lng,level
+1,0,Hall 1,10.5,20.5,0
+2,1,,11,21,1
+"""
+
+GEOJSON = json.dumps({
+    "type": "FeatureCollection",
+    "features": [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [20.5, 10.5]},
+            "properties": {"number": 1, "category_id": 0, "description": "Hall 1", "level": 0},
+        },
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [21, 11]},
+            "properties": {"number": 2, "level": 1},
+        },
+    ]
+})
+
+
+class BulkImportTestCase(C3BottlesTestCase):
+
+    def test_read_csv(self):
+        rows = read_rows(CSV.encode("utf-8"), "csv")
+        assert [r for r, _ in rows] == [2, 3]
+        assert rows[0][1]["description"] == "Hall 1"
+
+    def test_read_geojson(self):
+        rows = read_rows(GEOJSON, "geojson")
+        assert [r for r, _ in rows] == [1, 2]
+        assert rows[0][1]["lat"] == 10.5
+        assert rows[0][1]["lng"] == 20.5
+
+    def test_read_exceptions(self):
+        with self.assertRaisesRegex(ValueError, "file"):
+            read_rows("foo,bar\n1,2\n", "csv")
+        with self.assertRaisesRegex(ValueError, "file"):
+            read_rows("[]", "geojson")
+        with self.assertRaisesRegex(ValueError, "file"):
+            read_rows(b"\xff\xfe", "csv")
+
+    def test_guess_format(self):
+        assert guess_format("dps.geojson") == "geojson"
+        assert guess_format("dps.JSON") == "geojson"
+        assert guess_format("dps.csv") == "csv"
+
+    def check_import(self, data, fmt):
+        cursor = DropPointChange.get_cursor()
+        assert import_drop_points(read_rows(data, fmt)) == 2
+        db.session.commit()
+
+        dp = DropPoint.query.get(1)
+        assert dp.category_id == 0
+        assert dp.description == "Hall 1"
+        assert (dp.lat, dp.lng, dp.level) == (10.5, 20.5, 0)
+        assert dp.last_state == Report.states[1]
+        assert len(dp.locations) == 1
+        assert dp.current.location == dp.locations[0]
+        assert DropPoint.query.get(2).level == 1
+        assert DropPointChange.since(cursor)[0] == [1, 2]
+
+        dp.report(state=Report.states[5])
+        db.session.commit()
+        assert dp.last_state == Report.states[5]
+
+    def test_import_csv(self):
+        self.check_import(CSV, "csv")
+        assert DropPoint.query.get(2).category_id == 1
+
+    def test_import_geojson(self):
+        self.check_import(GEOJSON, "geojson")
+        assert DropPoint.query.get(2).category_id == 0
+
+    def test_import_errors(self):
+        DropPoint(1, lat=0, lng=0, level=0)
+        db.session.commit()
+        rows = [
+            (2, {"number": "1", "lat": "0", "lng": "0", "level": "0"}),
+            (3, {"number": "3", "lat": "foo", "lng": "0", "level": "0", "category_id": "7"}),
+            (4, {"number": "4", "lat": "0", "lng": "0", "level": "0"}),
+            (5, {"number": "4", "lat": "0", "lng": "0", "level": "0"}),
+        ]
+        with self.assertRaises(ValueError) as cm:
+            import_drop_points(rows)
+        errors = cm.exception.args
+        assert [list(e.keys())[0] for e in errors] == [2, 3, 5]
+        assert "number" in errors[0][2][0]
+        assert {"lat", "cat_id"} == {list(e)[0] for e in errors[1][3]}
+        assert len(list(error_messages(errors))) == 4
+        assert DropPoint.query.count() == 1
+
+    def test_admin_upload(self):
+        self.create_user(User(NAME, PASSWORD, is_admin=True))
+        self.c3bottles.post("/login", data=dict(username=NAME, password=PASSWORD))
+
+        res = self.c3bottles.post("/admin/import_drop_points", data={
+            "file": (BytesIO(CSV.encode("utf-8")), "dps.csv")
+        })
+        assert res.status_code == 302
+        assert DropPoint.query.count() == 2
+
+        res = self.c3bottles.post("/admin/import_drop_points", data={
+            "file": (BytesIO(CSV.encode("utf-8")), "dps.csv")
+        })
+        assert res.status_code == 302
+        assert DropPoint.query.count() == 2
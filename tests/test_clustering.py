@@ -0,0 +1,105 @@
+import json
+
+from c3bottles import app, db
+from c3bottles.lib.clustering import get_clusters
+from c3bottles.model.drop_point import DropPoint
+from c3bottles.model.report import Report
+
+from . import C3BottlesTestCase
+
+
+class ClusteringTestCase(C3BottlesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.map_source = app.config.get("MAP_SOURCE", {})
+        app.config["MAP_SOURCE"] = {"simple_crs": True}
+        dp1 = DropPoint(1, lat=10, lng=10, level=0)
+        dp2 = DropPoint(2, lat=20, lng=20, level=0)
+        DropPoint(3, lat=500, lng=500, level=0)
+        DropPoint(4, lat=10, lng=10, level=1)
+        DropPoint(5, lat=30, lng=30, level=0).remove()
+        dp1.report(state=Report.states[5])
+        dp2.report(state=Report.states[6])
+        db.session.commit()
+
+    def tearDown(self):
+        app.config["MAP_SOURCE"] = self.map_source
+        super().tearDown()
+
+    def test_clusters(self):
+        clusters = get_clusters(0, level=0)
+        assert [c["numbers"] for c in clusters] == [[1, 2], [3]]
+        assert clusters[0]["count"] == 2
+        assert clusters[0]["lat"] == 15 and clusters[0]["lng"] == 15
+        assert clusters[0]["states"] == {Report.states[5]: 1, Report.states[6]: 1}
+        assert clusters[0]["worst_state"] == Report.states[6]
+
+    def test_clusters_split_when_zooming_in(self):
+        assert [c["numbers"] for c in get_clusters(3, level=0)] == [[1], [2], [3]]
+
+    def test_clusters_in_bbox(self):
+        clusters = get_clusters(0, bbox="0,0,100,100")
+        assert sorted(n for c in clusters for n in c["numbers"]) == [1, 2, 4]
+
+    def test_clusters_api(self):
+        res = self.c3bottles.get("/api/clusters.json?zoom=0&level=1")
+        assert json.loads(res.data.decode("utf-8"))[0]["numbers"] == [4]
+        assert self.c3bottles.get("/api/clusters.json").status_code == 400
+
+    def test_clusters_of_unknown_level(self):
+        app.config["MAP_SOURCE"]["level_config"] = [[6, 0], [7, 1]]
+        assert [c["numbers"] for c in get_clusters(0, level=1)] == [[4]]
+        with self.assertRaisesRegex(ValueError, "level"):
+            get_clusters(0, level=2)
+
+    def test_empty_clusters_not_cached(self):
+        from c3bottles.lib.clustering import _clusters_cache
+        app.config["CACHE_MAX_AGE"] = 60
+        try:
+            assert get_clusters(0, level=5) == []
+            get_clusters(0, level=1)
+            assert list(_clusters_cache._entries) == [(0, 1)]
+        finally:
+            app.config["CACHE_MAX_AGE"] = 0
+
+    def test_tile(self):
+        # With a simple CRS, the y axis of tiles points south, so positive
+        # latitudes are found on tiles with negative y.
+        res = self.c3bottles.get("/tiles/dp/0/0/0/-1")
+        assert res.mimetype == "application/geo+json"
+        tile = json.loads(res.data.decode("utf-8"))
+        assert tile["type"] == "FeatureCollection"
+        assert [f["properties"]["number"] for f in tile["features"]] == [1, 2]
+        assert tile["features"][0]["geometry"]["coordinates"] == [10, 10]
+        res = self.c3bottles.get(
+            "/tiles/dp/0/0/0/-1", headers={"If-None-Match": res.headers["ETag"]}
+        )
+        assert res.status_code == 304
+
+    def test_tile_outside_bounds(self):
+        app.config["MAP_SOURCE"]["bounds"] = [[0, 0], [100, 100]]
+        assert self.c3bottles.get("/tiles/dp/0/1/0/-1").status_code == 200
+        assert self.c3bottles.get("/tiles/dp/0/0/1/-2").status_code == 404
+        assert self.c3bottles.get("/tiles/dp/0/1/-1/-1").status_code == 404
+        app.config["MAP_SOURCE"]["max_zoom"] = 5
+        assert self.c3bottles.get("/tiles/dp/0/6/0/-1").status_code == 404
+
+    def test_empty_tiles_not_cached(self):
+        from c3bottles.lib.tiles import _tiles_cache
+        app.config["CACHE_MAX_AGE"] = 60
+        try:
+            tile = json.loads(self.c3bottles.get("/tiles/dp/0/0/5/-5").data.decode("utf-8"))
+            assert tile["features"] == []
+            self.c3bottles.get("/tiles/dp/0/0/0/-1")
+            assert list(_tiles_cache._entries) == [(0, 0, 0, -1)]
+        finally:
+            app.config["CACHE_MAX_AGE"] = 0
+
+    def test_tile_bbox(self):
+        from c3bottles.lib.tiles import tile_bbox
+        assert tile_bbox(0, 0, 0) == (0, -256, 256, 0)
+        app.config["MAP_SOURCE"] = {}
+        west, south, east, north = tile_bbox(1, 1, 0)
+        assert (west, east) == (0, 180)
+        assert south == 0 and north > 85
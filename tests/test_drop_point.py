@@ -1,13 +1,17 @@
+import json
+import zlib
+
 import pytest
 
 from datetime import datetime, timedelta
 
 from flask_sqlalchemy import BaseQuery
 
-from c3bottles import db
-from c3bottles.model.drop_point import DropPoint
+from c3bottles import app, db
+from c3bottles.model.drop_point import DropPoint, fragment_fields, info_fields
 from c3bottles.model.location import Location
 from c3bottles.model.report import Report
+from c3bottles.model.visit import Visit
 
 from . import C3BottlesTestCase
 
@@ -275,3 +279,217 @@ class TwiceReportedDropPointTestCase(BaseDropPointTestCase):
 
     def test_dp_has_two_new_reports(self):
         assert self.dp.new_report_count == 2
+
+
+class BulkDropPointInfoTestCase(BaseDropPointTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dps = [self.dp]
+        for i in range(2, 6):
+            self.dps.append(DropPoint(
+                i, time=time, description="dp {}".format(i),
+                lat=i, lng=i, level=i % 2
+            ))
+        now = datetime.today()
+        self.dps[0].report(state=Report.states[4], time=now - timedelta(minutes=30))
+        self.dps[0].report(state=Report.states[6], time=now - timedelta(minutes=20))
+        self.dps[1].report(state=Report.states[5], time=now - timedelta(minutes=30))
+        self.dps[1].visit(action=Visit.actions[0], time=now - timedelta(minutes=20))
+        self.dps[1].report(state=Report.states[3], time=now - timedelta(minutes=10))
+        self.dps[2].report(state=Report.states[2], time=now - timedelta(minutes=30))
+        self.dps[2].visit(action=Visit.actions[1], time=now - timedelta(minutes=20))
+        self.dps[3].visit(action=Visit.actions[0], time=now - timedelta(minutes=20))
+        Location(self.dps[3], description="moved", lat=1, lng=2, level=1,
+                 time=now - timedelta(minutes=10))
+        self.dps[4].remove()
+        db.session.commit()
+
+    @staticmethod
+    def _without_priority(info):
+        return {k: v for k, v in info.items() if k != "priority"}
+
+    @staticmethod
+    def _sorted_numbers(dps):
+        return sorted(dp.number for dp in dps)
+
+    def test_bulk_info_matches_single_info(self):
+        bulk = DropPoint.get_dps_info(self.dps)
+        assert list(bulk.keys()) == [dp.number for dp in self.dps]
+        for dp in self.dps:
+            single = DropPoint.get_dp_info(dp.number)
+            assert self._without_priority(bulk[dp.number]) == \
+                self._without_priority(single)
+            assert bulk[dp.number]["priority"] == pytest.approx(single["priority"], abs=0.01)
+
+    def test_bulk_info_only_given_drop_points(self):
+        assert list(DropPoint.get_dps_info(self.dps[1:3]).keys()) == [2, 3]
+
+    def test_queue_is_ordered_by_priority(self):
+        queue = DropPoint.get_queue()
+        priorities = sorted(
+            (-dp.priority, dp.number) for dp in self.dps if not dp.removed
+        )
+        assert [dp["number"] for dp in queue] == [n for _, n in priorities]
+
+    def test_queue_without_base_time_last(self):
+        self.dps[0].current.priority_base = None
+        db.session.commit()
+        assert DropPoint.get_queue()[-1]["number"] == 1
+
+    def test_queue_limit_and_filters(self):
+        assert len(DropPoint.get_queue(limit=2)) == 2
+        assert {dp["number"] for dp in DropPoint.get_queue(level=1)} == {3, 4}
+        assert DropPoint.get_queue(category_id=1) == []
+
+    def test_queue_invalid_parameters(self):
+        res = self.c3bottles.get("/api/queue?limit=0&category=x")
+        assert res.status_code == 400
+        assert len(json.loads(res.data.decode("utf-8"))) == 2
+
+    def test_dps_in_level_and_bbox(self):
+        assert self._sorted_numbers(DropPoint.get_dps_in()) == [1, 2, 3, 4, 5]
+        assert self._sorted_numbers(DropPoint.get_dps_in(level=1)) == [3, 4, 5]
+        assert self._sorted_numbers(DropPoint.get_dps_in(bbox="1.5,1.5,3.5,3.5")) == [2, 3]
+        assert self._sorted_numbers(DropPoint.get_dps_in(level=0, bbox=(1.5, 1.5, 3.5, 3.5))) == [2]
+
+    def test_dps_json_in_bbox(self):
+        res = self.c3bottles.get("/api/all_dp.json?level=1&bbox=0,0,4,4")
+        assert sorted(json.loads(res.data.decode("utf-8")).keys()) == ["3", "4"]
+        res = self.c3bottles.get("/api/all_dp.json?bbox=4,4,0,0")
+        assert res.status_code == 400
+
+    def test_columns_match_info(self):
+        info = DropPoint.get_dps_info(self.dps)
+        compact = DropPoint.get_dps_columns(self.dps)
+        columns = compact["columns"]
+        for i, dp in enumerate(self.dps):
+            assert columns["number"][i] == dp.number
+            assert compact["states"][columns["last_state"][i]] == info[dp.number]["last_state"]
+            assert str(columns["base_time"][i]) == info[dp.number]["base_time"]
+            for c in ("category_id", "description", "reports_total", "reports_new",
+                      "priority_factor", "removed", "lat", "lng", "level"):
+                assert columns[c][i] == info[dp.number][c]
+
+    def test_columns_format(self):
+        res = self.c3bottles.get("/api/all_dp.json?format=columns")
+        assert res.mimetype == "application/vnd.c3bottles.columns+json"
+        data = json.loads(res.data.decode("utf-8"))
+        assert data["columns"]["number"] == [1, 2, 3, 4, 5]
+        res = self.c3bottles.get(
+            "/api/all_dp.json?level=1",
+            headers={"Accept": "application/vnd.c3bottles.columns+json"}
+        )
+        assert json.loads(res.data.decode("utf-8"))["columns"]["number"] == [3, 4, 5]
+        res = self.c3bottles.get("/api/all_dp.json")
+        assert res.mimetype == "application/json"
+        assert "columns" not in json.loads(res.data.decode("utf-8"))
+
+    def test_dps_in_filters(self):
+        assert self._sorted_numbers(DropPoint.get_dps_in(removed="false")) == [1, 2, 3, 4]
+        assert self._sorted_numbers(DropPoint.get_dps_in(removed=True)) == [5]
+        assert self._sorted_numbers(DropPoint.get_dps_in(numbers="2,4,9")) == [2, 4]
+        assert self._sorted_numbers(DropPoint.get_dps_in(category_id=0, level=0)) == [2]
+        assert DropPoint.get_dps_in(category_id=1) == []
+        with pytest.raises(ValueError):
+            DropPoint.get_dps_in(removed="maybe", numbers="x")
+
+    def test_dps_info_fields(self):
+        info = DropPoint.get_dps_info(self.dps, fields=("lat", "last_state"))
+        assert info[1] == {"last_state": self.dp.last_state, "lat": lat}
+
+    def test_sparse_fieldsets(self):
+        res = self.c3bottles.get("/api/all_dp.json?fields=number,level&removed=0&numbers=1,5")
+        assert json.loads(res.data.decode("utf-8")) == {"1": {"number": 1, "level": level}}
+        res = self.c3bottles.get("/api/all_dp.json?format=columns&fields=last_state")
+        assert list(json.loads(res.data.decode("utf-8"))["columns"].keys()) == ["last_state"]
+        res = self.c3bottles.get("/api/all_dp.json?fields=number,secret")
+        assert res.status_code == 400
+
+    def test_dps_json_format(self):
+        dps = DropPoint.query.order_by(DropPoint.number).all()
+        assert DropPoint.get_dps_json(fields=fragment_fields) == \
+            json.dumps(DropPoint.get_dps_info(dps, fragment_fields))
+        info = json.loads(DropPoint.get_dps_json(), object_pairs_hook=list)[0][1]
+        assert [k for k, _ in info] == [f for f, _ in info_fields]
+        app.debug = True
+        try:
+            assert DropPoint.get_dps_json(fields=fragment_fields) == \
+                json.dumps(DropPoint.get_dps_info(dps, fragment_fields), indent=4)
+        finally:
+            app.debug = False
+
+    def test_dps_json_is_streamed_in_chunks(self):
+        from c3bottles.model import drop_point
+        chunk_size, drop_point.chunk_size = drop_point.chunk_size, 2
+        try:
+            chunks = list(DropPoint.iter_dps_json())
+            res = self.c3bottles.get("/api/all_dp.json")
+            data = res.data
+        finally:
+            drop_point.chunk_size = chunk_size
+        assert len(chunks) == 3
+        dps = json.loads("".join(chunks))
+        assert list(dps.keys()) == ["1", "2", "3", "4", "5"]
+        assert json.loads(data.decode("utf-8")).keys() == dps.keys()
+
+    def test_dps_json_is_streamed_compressed(self):
+        from c3bottles.model import drop_point
+        chunk_size, drop_point.chunk_size = drop_point.chunk_size, 2
+        try:
+            res = self.c3bottles.get(
+                "/api/all_dp.json", headers={"Accept-Encoding": "gzip"}, buffered=False
+            )
+            chunks = list(res.response)
+        finally:
+            drop_point.chunk_size = chunk_size
+        assert res.headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in res.headers
+        assert len(chunks) == 4
+        data = zlib.decompress(b"".join(chunks), 16 + zlib.MAX_WBITS)
+        assert list(json.loads(data.decode("utf-8")).keys()) == ["1", "2", "3", "4", "5"]
+
+
+class DropPointHistoryTestCase(BaseDropPointTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(6):
+            self.dp.report(state=Report.states[i], time=time + timedelta(minutes=i))
+        self.dp.visit(action=Visit.actions[0], time=time + timedelta(minutes=3))
+        self.dp.visit(action=Visit.actions[1], time=time + timedelta(minutes=7))
+        Location(self.dp, description="moved", lat=1, lng=2, level=0,
+                 time=time + timedelta(minutes=8))
+        self.dp.remove()
+        db.session.commit()
+
+    def test_history_is_ordered(self):
+        history = self.dp.history
+        assert len(history) == 12
+        assert history[0] == {"time": self.dp.removed, "removed": True}
+        assert history[1]["location"].description == "moved"
+        assert history[-1] == {"time": time, "drop_point": self.dp}
+        assert [e["time"] for e in history] == sorted((e["time"] for e in history), reverse=True)
+
+    def test_history_pages(self):
+        pages, before = [], None
+        while True:
+            page, before = self.dp.get_history(before=before, limit=4)
+            pages.append(page)
+            if before is None:
+                break
+        assert [len(p) for p in pages] == [4, 4, 4]
+        assert [e for p in pages for e in p] == self.dp.history
+
+    def test_history_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            self.dp.get_history(before="yesterday")
+
+    def test_history_api(self):
+        history, before = self.dp.get_history(limit=5)
+        res = self.c3bottles.get("/api/history/{}?before={}".format(self.dp.number, before))
+        data = json.loads(res.data.decode("utf-8"))
+        assert data["html"].count("<tr>") == 7
+        assert data["before"] is None
+        assert self.c3bottles.get("/api/history/1?before=x").status_code == 400
+        assert self.c3bottles.get("/api/history/2").status_code == 404
@@ -0,0 +1,149 @@
+import json
+
+from c3bottles import app, db
+from c3bottles.model.drop_point import DropPoint, _dps_json_cache, _fragments
+from c3bottles.model.drop_point_change import DropPointChange
+from c3bottles.model.location import Location
+from c3bottles.model.report import Report
+from c3bottles.model.visit import Visit
+
+from . import C3BottlesTestCase
+
+
+class DropPointChangeTestCase(C3BottlesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for number in range(1, 4):
+            DropPoint(number, lat=0, lng=0, level=0)
+        db.session.commit()
+        self.cursor = DropPointChange.get_cursor()
+
+    def test_creation_is_logged(self):
+        assert DropPointChange.since(0) == ([1, 2, 3], self.cursor)
+
+    def test_no_changes(self):
+        assert DropPointChange.since(self.cursor) == ([], self.cursor)
+
+    def test_mutations_are_logged(self):
+        dps = {dp.number: dp for dp in DropPoint.query.all()}
+        Report(dps[3], state=Report.states[5])
+        db.session.commit()
+        Visit(dps[1], action=Visit.actions[0])
+        db.session.commit()
+        numbers, cursor = DropPointChange.since(self.cursor)
+        assert numbers == [3, 1]
+        assert cursor > self.cursor
+        Location(dps[2], lat=1, lng=1, level=0)
+        db.session.commit()
+        dps[1].remove()
+        db.session.commit()
+        assert DropPointChange.since(cursor)[0] == [2, 1]
+
+    def test_changes_json(self):
+        dp = DropPoint.query.get(2)
+        dp.report(state=Report.states[6])
+        db.session.commit()
+        changes = json.loads(DropPoint.get_changes_json(self.cursor))
+        assert changes["cursor"] == DropPointChange.get_cursor()
+        assert list(changes["drop_points"].keys()) == ["2"]
+        assert changes["drop_points"]["2"]["last_state"] == Report.states[6]
+        assert json.loads(DropPoint.get_changes_json(changes["cursor"])) == \
+            {"cursor": changes["cursor"], "drop_points": {}}
+
+    def test_stream(self):
+        app.config["STREAM_TIMEOUT"] = 0
+        DropPoint.query.get(3).report(state=Report.states[5])
+        db.session.commit()
+        res = self.c3bottles.get("/api/stream?cursor={}".format(self.cursor))
+        assert res.mimetype == "text/event-stream"
+        lines = res.data.decode("utf-8").splitlines()
+        assert lines[0] == "id: {}".format(DropPointChange.get_cursor())
+        assert lines[1] == "event: drop_points"
+        data = json.loads("".join(line[len("data: "):] for line in lines[2:] if line))
+        assert list(data.keys()) == ["3"]
+
+    def test_stream_keepalive(self):
+        app.config["STREAM_TIMEOUT"] = 0
+        res = self.c3bottles.get(
+            "/api/stream", headers={"Last-Event-ID": str(self.cursor)}
+        )
+        assert res.data == b": keepalive\n\n"
+
+    def test_wait_for_polled_changes(self):
+        from c3bottles.model import drop_point_change
+        drop_point_change._latest = 0
+        DropPointChange.poll()
+        assert not DropPointChange.wait(self.cursor, 0)
+        DropPoint.query.get(3).report(state=Report.states[5])
+        db.session.commit()
+        assert not DropPointChange.wait(self.cursor, 0)
+        DropPointChange.poll()
+        assert DropPointChange.wait(self.cursor, 0)
+        assert not DropPointChange.wait(DropPointChange.get_cursor(), 0)
+
+    def test_stream_without_cursor(self):
+        assert self.c3bottles.get("/api/stream").status_code == 400
+
+
+class CachedDropPointsTestCase(C3BottlesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        app.config["CACHE_MAX_AGE"] = 60
+        self.dp = DropPoint(1, lat=0, lng=0, level=0)
+        db.session.commit()
+
+    def tearDown(self):
+        app.config["CACHE_MAX_AGE"] = 0
+        super().tearDown()
+
+    def test_snapshot_is_reused(self):
+        assert DropPoint.get_dps_json(compact=True) is DropPoint.get_dps_json(compact=True)
+
+    def test_snapshot_key_is_normalized(self):
+        json1 = DropPoint.get_dps_json(compact=True, level="0", removed="false")
+        assert DropPoint.get_dps_json(compact=True, level=" 00", removed=" 0") is json1
+        assert [k for k in _dps_json_cache._entries if k[3]] == \
+            [(None, True, None, (("level", 0), ("removed", False)))]
+
+    def test_empty_snapshot_is_not_cached(self):
+        DropPoint.get_dps_json(compact=True, level=5)
+        assert not [k for k in _dps_json_cache._entries if k[3]]
+
+    def test_fragments_are_invalidated_individually(self):
+        dp2 = DropPoint(2, lat=0, lng=0, level=0)
+        db.session.commit()
+        DropPoint.get_dps_json()
+        fragment = dict(_fragments._entries)[(2, "en")][1]
+        self.dp.report(state=Report.states[6])
+        db.session.commit()
+        dps = json.loads(DropPoint.get_dps_json())
+        assert dps["1"]["last_state"] == Report.states[6]
+        assert _fragments._entries[(2, "en")][1] is fragment
+        assert dps["2"] == DropPoint.get_dps_info([dp2])[2]
+
+    def test_snapshot_follows_changes(self):
+        before = DropPoint.get_dps_json()
+        self.dp.report(state=Report.states[6])
+        db.session.commit()
+        after = DropPoint.get_dps_json()
+        assert after != before
+        assert json.loads(after)["1"]["last_state"] == Report.states[6]
+
+    def test_shared_endpoint(self):
+        res = self.c3bottles.get("/api/drop_points/de.json")
+        assert res.status_code == 200
+        assert "public" in res.headers["Cache-Control"]
+        assert "Set-Cookie" not in res.headers
+        data = json.loads(res.data.decode("utf-8"))
+        assert data["cursor"] == DropPointChange.get_cursor()
+        assert list(data["drop_points"].keys()) == ["1"]
+        res = self.c3bottles.get(
+            "/api/drop_points/de.json",
+            headers={"If-None-Match": res.headers["ETag"]}
+        )
+        assert res.status_code == 304
+
+    def test_shared_endpoint_unknown_language(self):
+        assert self.c3bottles.get("/api/drop_points/xx.json").status_code == 404
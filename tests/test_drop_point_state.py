@@ -0,0 +1,113 @@
+import pytest
+
+from datetime import datetime, timedelta
+
+from c3bottles import db
+from c3bottles.model.drop_point import DropPoint
+from c3bottles.model.drop_point_state import DropPointState
+from c3bottles.model.location import Location
+from c3bottles.model.report import Report
+from c3bottles.model.visit import Visit
+
+from . import C3BottlesTestCase
+
+
+columns = (
+    "loc_id", "location_time", "description", "lat", "lng", "level",
+    "last_report_id", "last_report_time", "last_report_state",
+    "last_visit_id", "last_visit_time", "last_visit_action",
+    "last_emptied_time", "last_state", "total_report_count",
+    "new_report_count", "report_weight_sum", "priority_base"
+)
+
+
+class DropPointStateTestCase(C3BottlesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.time = datetime.today() - timedelta(hours=2)
+        self.dp = DropPoint(1, time=self.time, description="here", lat=1, lng=2, level=3)
+        db.session.commit()
+
+    def test_state_created_with_drop_point(self):
+        state = DropPointState.query.get(1)
+        assert state is self.dp.current
+        assert state.last_state == Report.states[1]
+        assert state.total_report_count == 0
+        assert state.new_report_count == 0
+
+    def test_state_follows_location(self):
+        location = Location(self.dp, description="there", lat=4, lng=5, level=6)
+        db.session.commit()
+        assert self.dp.current.location == location
+        assert (self.dp.description, self.dp.lat, self.dp.lng, self.dp.level) == \
+            ("there", 4, 5, 6)
+
+    def test_state_follows_reports_and_visits(self):
+        now = datetime.today()
+        self.dp.report(state=Report.states[5], time=now - timedelta(minutes=30))
+        db.session.commit()
+        assert self.dp.last_state == Report.states[5]
+        assert self.dp.new_report_count == 1
+
+        self.dp.visit(action=Visit.actions[1], time=now - timedelta(minutes=20))
+        db.session.commit()
+        assert self.dp.last_state == Report.states[5]
+        assert self.dp.new_report_count == 0
+
+        self.dp.visit(action=Visit.actions[0], time=now - timedelta(minutes=10))
+        db.session.commit()
+        assert self.dp.last_state == Report.states[-1]
+        assert self.dp.total_report_count == 1
+
+    def test_visit_before_last_report(self):
+        now = datetime.today()
+        self.dp.report(state=Report.states[3], time=now - timedelta(minutes=30))
+        self.dp.report(state=Report.states[6], time=now - timedelta(minutes=10))
+        db.session.commit()
+        self.dp.visit(action=Visit.actions[0], time=now - timedelta(minutes=20))
+        db.session.commit()
+        assert self.dp.new_report_count == 1
+        assert self.dp.last_state == Report.states[6]
+
+    def test_report_weight_sum(self):
+        now = datetime.today()
+        for i, state in enumerate(Report.states[2:7]):
+            self.dp.report(state=state, time=now - timedelta(minutes=30 - i))
+        # an older report has to be sorted in
+        self.dp.report(state=Report.states[6], time=now - timedelta(minutes=40))
+        db.session.commit()
+        expected = sum(
+            r.get_weight() / 2**i for i, r in enumerate(self.dp.new_reports)
+        )
+        assert self.dp.current.report_weight_sum == pytest.approx(expected)
+
+        self.dp.visit(action=Visit.actions[0], time=now - timedelta(minutes=20))
+        db.session.commit()
+        assert self.dp.current.report_weight_sum == 0
+        assert self.dp.priority_factor == pytest.approx(1.0 / self.dp.visit_interval)
+
+    def test_rebuild(self):
+        now = datetime.today()
+        self.dp.report(state=Report.states[4], time=now - timedelta(minutes=50))
+        self.dp.visit(action=Visit.actions[0], time=now - timedelta(minutes=40))
+        self.dp.report(state=Report.states[6], time=now - timedelta(minutes=30))
+        Location(self.dp, description="there", lat=4, lng=5, level=6,
+                 time=now - timedelta(minutes=20))
+        DropPoint(2, time=self.time, lat=0, lng=0, level=0)
+        db.session.commit()
+
+        expected = {
+            s.dp_id: tuple(getattr(s, c) for c in columns)
+            for s in DropPointState.query.all()
+        }
+
+        DropPointState.query.delete()
+        db.session.commit()
+        DropPointState.rebuild()
+        db.session.commit()
+
+        assert {
+            s.dp_id: tuple(getattr(s, c) for c in columns)
+            for s in DropPointState.query.all()
+        } == expected
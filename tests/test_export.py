@@ -0,0 +1,165 @@
+import fcntl
+import json
+import multiprocessing
+import os
+import unittest
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest.mock import patch
+
+from PyPDF2 import PdfFileReader
+
+from c3bottles import app, db
+from c3bottles.lib.export import LabelExport, export_dir, lock_file
+from c3bottles.model.drop_point import DropPoint
+
+from . import C3BottlesTestCase, NAME, PASSWORD
+from .test_labels import cairo_available
+
+
+def render_pdfs(numbers, f, progress=None):
+    f.write(b"%PDF " + " ".join(str(n) for n in numbers).encode("utf-8"))
+
+
+class LabelExportTestCase(C3BottlesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dir = TemporaryDirectory()
+        app.config["LABEL_CACHE_DIR"] = self.dir.name + "/cache"
+        app.config["LABEL_EXPORT_DIR"] = self.dir.name + "/exports"
+        app.config["LABEL_WORKERS"] = 1
+        dps = [DropPoint(i, category_id=i % 2, lat=0, lng=0, level=i % 3) for i in range(1, 6)]
+        dps[4].remove()
+        db.session.commit()
+
+    def tearDown(self):
+        for key in ("LABEL_CACHE_DIR", "LABEL_EXPORT_DIR", "LABEL_WORKERS"):
+            app.config.pop(key, None)
+        self.dir.cleanup()
+        super().tearDown()
+
+    def wait(self, job):
+        for _ in range(200):
+            job = LabelExport.get(job.id)
+            if job.state in ("DONE", "FAILED"):
+                return job
+            sleep(0.05)
+        self.fail("Export did not finish.")
+
+    @unittest.skipUnless(cairo_available(), "cairo is not available")
+    def test_export(self):
+        job = self.wait(LabelExport.start())
+        assert job.state == "DONE"
+        assert job.done == job.total == 4
+        with open(job.path, "rb") as f:
+            assert PdfFileReader(f).getNumPages() == 4
+
+    def test_export_in_pool(self):
+        # Without cairo, the pool fails to render the labels, which has to
+        # free the lock and end all processes as well.
+        app.config["LABEL_WORKERS"] = 2
+        for _ in range(2):
+            job = self.wait(LabelExport.start())
+            if cairo_available():
+                assert job.state == "DONE"
+                with open(job.path, "rb") as f:
+                    assert PdfFileReader(f).getNumPages() == 4
+        for _ in range(100):
+            if not multiprocessing.active_children():
+                break
+            sleep(0.05)
+        else:
+            self.fail("Export processes did not exit.")
+        with open(os.path.join(export_dir(), lock_file), "w") as lock:
+            fcntl.lockf(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def test_export_spawned(self):
+        with patch("c3bottles.lib.export._context",
+                   return_value=multiprocessing.get_context("spawn")):
+            job = self.wait(LabelExport.start())
+        assert job.state == ("DONE" if cairo_available() else "FAILED")
+
+    def test_export_reused(self):
+        with patch("c3bottles.lib.labels.render_pdfs", render_pdfs):
+            job = self.wait(LabelExport.start())
+        assert job.state == "DONE"
+        again = LabelExport.start()
+        assert again.id == job.id
+        assert again.created == job.created
+        assert self.wait(LabelExport.start(first=2)).id != job.id
+
+    def test_export_filters(self):
+        assert self.wait(LabelExport.start(category_id=1)).total == 2
+        assert self.wait(LabelExport.start(level=0)).total == 1
+        assert self.wait(LabelExport.start(first=2, last=4)).total == 3
+        assert self.wait(LabelExport.start(numbers="1,5")).total == 1
+
+    def test_export_exceptions(self):
+        with self.assertRaisesRegex(ValueError, "first"):
+            LabelExport.start(first="foo")
+        with self.assertRaisesRegex(ValueError, "cat_id"):
+            LabelExport.start(category_id="foo")
+
+    def test_get(self):
+        job = self.wait(LabelExport.start())
+        assert LabelExport.get(job.id).total == 4
+        assert LabelExport.get("nonexistent") is None
+        assert LabelExport.get("../foo") is None
+
+    def login(self):
+        self.create_test_user()
+        self.c3bottles.post("/login", data=dict(username=NAME, password=PASSWORD))
+
+    def test_views_exceptions(self):
+        res = self.c3bottles.post("/label/export")
+        assert res.status_code == 401
+
+        self.login()
+        res = self.c3bottles.post("/label/export", data={"last": "foo"})
+        assert res.status_code == 400
+        assert "last" in json.loads(res.data.decode("utf-8"))[0]
+        assert self.c3bottles.get("/label/export/nonexistent").status_code == 404
+        assert self.c3bottles.get("/label/export/nonexistent.pdf").status_code == 404
+
+    def test_all_labels(self):
+        assert self.c3bottles.get("/label/all.pdf").status_code == 401
+
+        self.login()
+        with patch("c3bottles.lib.labels.render_pdfs", render_pdfs):
+            res = self.c3bottles.get("/label/all.pdf")
+        assert res.status_code == 202
+        status = json.loads(res.data.decode("utf-8"))
+        assert status["total"] == 4
+        assert res.headers["Location"].endswith("/label/export/" + status["id"])
+        assert self.wait(LabelExport.get(status["id"])).state == "DONE"
+
+        res = self.c3bottles.get("/label/all.pdf")
+        assert res.status_code == 200
+        assert res.mimetype == "application/pdf"
+        assert "private" in res.headers["Cache-Control"]
+        assert res.data == b"%PDF 1 2 3 4"
+        res.close()
+        res = self.c3bottles.get(
+            "/label/all.pdf", headers={"If-None-Match": res.headers["ETag"]}
+        )
+        assert res.status_code == 304
+
+    @unittest.skipUnless(cairo_available(), "cairo is not available")
+    def test_views(self):
+        self.login()
+        res = self.c3bottles.post("/label/export", data={"first": 2})
+        assert res.status_code == 202
+        self.wait(LabelExport.get(json.loads(res.data.decode("utf-8"))["id"]))
+
+        res = self.c3bottles.get(res.headers["Location"])
+        status = json.loads(res.data.decode("utf-8"))
+        assert status["state"] == "DONE"
+        assert status["total"] == 3
+
+        res = self.c3bottles.get(status["download"])
+        assert res.status_code == 200
+        assert res.mimetype == "application/pdf"
+        assert PdfFileReader(BytesIO(res.data)).getNumPages() == 3
+        res.close()
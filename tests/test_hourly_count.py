@@ -0,0 +1,114 @@
+import json
+from datetime import datetime, timedelta
+
+from c3bottles import db
+from c3bottles.model.drop_point import DropPoint
+from c3bottles.model.drop_point_state import timestamp
+from c3bottles.model.hourly_count import HourlyCount, floor_hour, unknown_level
+from c3bottles.model.location import Location
+from c3bottles.model.report import Report
+from c3bottles.model.visit import Visit
+
+from . import C3BottlesTestCase
+
+
+class HourlyCountTestCase(C3BottlesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.hour = floor_hour(datetime.today()) - timedelta(hours=5)
+        self.dp1 = DropPoint(1, lat=0, lng=0, level=0, time=self.hour - timedelta(days=1))
+        self.dp2 = DropPoint(2, category_id=1, lat=0, lng=0, level=1,
+                             time=self.hour - timedelta(days=1))
+        self.dp1.report(state=Report.states[5], time=self.hour + timedelta(minutes=5))
+        self.dp1.report(state=Report.states[5], time=self.hour + timedelta(minutes=50))
+        self.dp2.report(state=Report.states[6], time=self.hour + timedelta(minutes=10))
+        db.session.commit()
+        self.dp1.report(state=Report.states[5], time=self.hour + timedelta(hours=2))
+        self.dp1.visit(action=Visit.actions[0], time=self.hour + timedelta(hours=2))
+        db.session.commit()
+
+    def counts(self):
+        return sorted(
+            (c.hour, c.kind, c.value, c.category_id, c.level, c.count)
+            for c in HourlyCount.query.all()
+        )
+
+    def test_incremental_counts(self):
+        later = self.hour + timedelta(hours=2)
+        assert self.counts() == sorted([
+            (self.hour, "report", Report.states[5], 0, 0, 2),
+            (self.hour, "report", Report.states[6], 1, 1, 1),
+            (later, "report", Report.states[5], 0, 0, 1),
+            (later, "visit", Visit.actions[0], 0, 0, 1),
+        ])
+
+    def test_unknown_level_is_counted_once(self):
+        self.dp2.current.level = None
+        db.session.commit()
+        for minutes in (20, 30):
+            self.dp2.report(state=Report.states[6], time=self.hour + timedelta(minutes=minutes))
+            db.session.commit()
+        assert HourlyCount.query.filter(HourlyCount.level == unknown_level).one().count == 2
+
+    def test_backfill(self):
+        incremental = self.counts()
+        HourlyCount.query.delete()
+        db.session.commit()
+        assert HourlyCount.backfill() == 4
+        db.session.commit()
+        assert self.counts() == incremental
+
+    def test_backfill_level_at_time(self):
+        Location(self.dp1, time=self.hour + timedelta(hours=1), lat=0, lng=0, level=3)
+        db.session.commit()
+        HourlyCount.backfill()
+        db.session.commit()
+        levels = {(c.hour, c.kind, c.category_id): c.level for c in HourlyCount.query}
+        assert levels[self.hour, "report", 0] == 0
+        assert levels[self.hour + timedelta(hours=2), "visit", 0] == 3
+
+    def test_timeseries(self):
+        start = timestamp(self.hour) + 60
+        ret = HourlyCount.timeseries(start=start, end=start + 3 * 3600)
+        assert ret["hours"][0] == timestamp(self.hour)
+        assert len(ret["hours"]) == 4
+        assert ret["reports"][Report.states[5]] == [2, 0, 1, 0]
+        assert ret["reports"][Report.states[6]] == [1, 0, 0, 0]
+        assert ret["visits"][Visit.actions[0]] == [0, 0, 1, 0]
+        assert set(ret["visits"]) == set(Visit.actions)
+
+    def test_timeseries_filters(self):
+        start = timestamp(self.hour)
+        ret = HourlyCount.timeseries(start=start, end=start, category_id=1)
+        assert ret["reports"][Report.states[5]] == [0]
+        assert ret["reports"][Report.states[6]] == [1]
+        ret = HourlyCount.timeseries(start=start, end=start, level=0)
+        assert ret["reports"][Report.states[5]] == [2]
+        assert ret["reports"][Report.states[6]] == [0]
+
+    def test_timeseries_default_range(self):
+        ret = HourlyCount.timeseries()
+        assert len(ret["hours"]) in (24, 25)
+        assert sum(ret["reports"][Report.states[5]]) == 3
+
+    def test_timeseries_exceptions(self):
+        with self.assertRaisesRegex(ValueError, "start"):
+            HourlyCount.timeseries(start="foo")
+        with self.assertRaisesRegex(ValueError, "start"):
+            HourlyCount.timeseries(start=2000, end=1000)
+        with self.assertRaisesRegex(ValueError, "end"):
+            HourlyCount.timeseries(start=0, end=10 ** 9)
+        with self.assertRaisesRegex(ValueError, "level"):
+            HourlyCount.timeseries(level="foo")
+
+    def test_timeseries_json(self):
+        res = self.c3bottles.get("/numbers/timeseries.json?start={}&end={}".format(
+            timestamp(self.hour), timestamp(self.hour) + 3600
+        ))
+        assert res.status_code == 200
+        ret = json.loads(res.data.decode("utf-8"))
+        assert ret["reports"][Report.states[5]] == [2, 0]
+        res = self.c3bottles.get("/numbers/timeseries.json?category=foo")
+        assert res.status_code == 400
+        assert "category" in json.loads(res.data.decode("utf-8"))[0]
@@ -0,0 +1,177 @@
+import os
+import unittest
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+from xml.dom.minidom import parseString
+
+from PyPDF2 import PdfFileReader
+
+from c3bottles import app
+from c3bottles.lib.cache import DiskCache
+from c3bottles.lib.labels import create_pdf, create_pdfs, create_svgs, label_cache, label_key, \
+    labels_key, qr_path, render_pdf, render_svg, svg_key, write_pdfs
+
+from . import C3BottlesTestCase
+
+
+def cairo_available():
+    try:
+        with app.test_request_context():
+            render_pdf(1)
+    except Exception:  # noqa
+        return False
+    return True
+
+
+class DiskCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.cache = DiskCache(self.dir.name, 10)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_get_and_put(self):
+        assert self.cache.get("a") is None
+        self.cache.put("a", b"1234")
+        assert self.cache.get("a") == b"1234"
+
+    def test_eviction(self):
+        self.cache.put_all([("a", b"1234"), ("b", b"1234")])
+        os.utime(os.path.join(self.dir.name, "a"), (0, 0))
+        os.utime(os.path.join(self.dir.name, "b"), (1, 1))
+        self.cache.get("a")
+        self.cache.put("c", b"1234")
+        assert self.cache.get("a") == b"1234"
+        assert self.cache.get("b") is None
+        assert self.cache.get("c") == b"1234"
+
+    def test_disabled(self):
+        cache = DiskCache(self.dir.name, 0)
+        cache.put("a", b"1234")
+        assert cache.get("a") is None
+        assert os.listdir(self.dir.name) == []
+
+
+class LabelKeyTestCase(C3BottlesTestCase):
+
+    def tearDown(self):
+        app.config.pop("LABEL_STYLE", None)
+        super().tearDown()
+
+    def test_label_key(self):
+        key = label_key(1)
+        assert key == label_key(1)
+        assert key != label_key(2)
+        with app.test_request_context(base_url="https://example.org/"):
+            assert key != label_key(1)
+        app.config["LABEL_STYLE"] = "35c3"
+        assert key != label_key(1)
+
+    def test_labels_key(self):
+        assert labels_key([1, 2]) == labels_key([1, 2])
+        assert labels_key([1, 2]) != labels_key([2, 1])
+
+
+class LabelSvgTestCase(C3BottlesTestCase):
+
+    def tearDown(self):
+        app.config.pop("LABEL_STYLE", None)
+        super().tearDown()
+
+    def test_qr_path(self):
+        assert qr_path([[True, True, False, True], [False] * 4, [True] * 4]) == \
+            "M0,0h2v1h-2zM3,0h1v1h-1zM0,2h4v1h-4z"
+
+    def test_styles(self):
+        for style in ("default", "34c3", "35c3"):
+            app.config["LABEL_STYLE"] = style
+            svg = render_svg(42)
+            parseString(svg)
+            assert "data:image/png" not in svg
+            assert 'd="M' in svg
+
+
+class CachedLabelsTestCase(C3BottlesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dir = TemporaryDirectory()
+        app.config["LABEL_CACHE_DIR"] = self.dir.name
+
+    def tearDown(self):
+        app.config.pop("LABEL_WORKERS", None)
+        app.config.pop("LABEL_CACHE_DIR", None)
+        self.dir.cleanup()
+        super().tearDown()
+
+    def test_svgs_from_cache(self):
+        label_cache().put(svg_key(2), b"<svg/>")
+        svgs = list(create_svgs([3, 2, 1]))
+        assert svgs[1] == b"<svg/>"
+        assert svgs[0] == render_svg(3).encode("utf-8")
+        assert label_cache().get(svg_key(1)) == svgs[2]
+
+    def test_svgs_in_pool(self):
+        app.config["LABEL_WORKERS"] = 2
+        f = BytesIO()
+        with patch("c3bottles.lib.labels.render_pdfs") as render_pdfs:
+            write_pdfs(range(1, 6), f)
+        render_pdfs.assert_called_once()
+        assert render_pdfs.call_args[0][:2] == ([1, 2, 3, 4, 5], f)
+        for number in range(1, 6):
+            assert label_cache().get(svg_key(number)) == render_svg(number).encode("utf-8")
+
+
+@unittest.skipUnless(cairo_available(), "cairo is not available")
+class LabelTestCase(C3BottlesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dir = TemporaryDirectory()
+        app.config["LABEL_CACHE_DIR"] = self.dir.name
+
+    def tearDown(self):
+        app.config.pop("LABEL_WORKERS", None)
+        app.config.pop("LABEL_CACHE_DIR", None)
+        self.dir.cleanup()
+        super().tearDown()
+
+    def test_cached_label(self):
+        pdf = create_pdf(1)
+        assert label_cache().get(label_key(1)) == pdf
+        assert create_pdf(1) == pdf
+
+    def test_single_label(self):
+        assert PdfFileReader(BytesIO(create_pdf(1))).getNumPages() == 1
+
+    def test_labels_cached_per_label(self):
+        pdf = PdfFileReader(BytesIO(create_pdfs(range(1, 4))))
+        assert pdf.getNumPages() == 3
+        for number in range(1, 4):
+            assert label_cache().get(svg_key(number)) is not None
+        label_cache().put(svg_key(2), render_svg(4).encode("utf-8"))
+        pdf = PdfFileReader(BytesIO(create_pdfs(range(1, 4))))
+        assert "4" in pdf.getPage(1).extractText()
+
+    def test_labels_in_process(self):
+        assert PdfFileReader(BytesIO(create_pdfs(range(1, 6)))).getNumPages() == 5
+
+    def test_labels_to_file(self):
+        app.config["LABEL_WORKERS"] = 1
+        f = BytesIO()
+        progress = []
+        write_pdfs(range(1, 4), f, lambda done, total: progress.append((done, total)))
+        assert PdfFileReader(f).getNumPages() == 3
+        assert progress[-1] == (3, 3)
+
+    def test_labels_in_pool(self):
+        app.config["LABEL_WORKERS"] = 2
+        f = BytesIO()
+        write_pdfs(range(1, 6), f)
+        pdf = PdfFileReader(f)
+        assert pdf.getNumPages() == 5
+        for i in range(5):
+            assert str(i + 1) in pdf.getPage(i).extractText()
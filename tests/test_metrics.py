@@ -0,0 +1,74 @@
+from flask import Response
+from prometheus_client import REGISTRY
+
+from c3bottles import app, db
+from c3bottles.lib.metrics import StatisticsCollector, after_request, before_request, fingerprint
+from c3bottles.model.drop_point import DropPoint
+
+from . import C3BottlesTestCase
+
+
+class StatisticsCollectorTestCase(C3BottlesTestCase):
+
+    def test_gauges(self):
+        DropPoint(1, lat=0, lng=0, level=0).report(state="FULL")
+        db.session.commit()
+        gauges = {m.name: m.samples[0].value for m in StatisticsCollector().collect()}
+        assert gauges == {
+            "c3bottles_drop_point_count": 1,
+            "c3bottles_report_count": 1,
+            "c3bottles_visit_count": 0,
+        }
+
+
+class QueryInstrumentationTestCase(C3BottlesTestCase):
+
+    def test_fingerprint(self):
+        assert fingerprint(
+            "SELECT a FROM t\n WHERE t.id IN (?, ?, ?) AND t.name = 'x' LIMIT 10"
+        ) == "SELECT a FROM t WHERE t.id IN (?) AND t.name = ? LIMIT ?"
+        assert fingerprint("SELECT a FROM t WHERE t.id = %(id_1)s") == \
+            fingerprint("SELECT a FROM t WHERE t.id = %(id_2)s")
+
+    def test_queries_are_counted(self):
+        app.config["SQL_QUERY_BUDGET"] = 2
+        try:
+            with app.test_request_context("/list"):
+                app.preprocess_request()
+                before_request()
+                for number in range(1, 4):
+                    DropPoint.query.get(number)
+                response = after_request(Response())
+                with self.assertLogs(app.logger, "WARNING") as log:
+                    response.close()
+        finally:
+            del app.config["SQL_QUERY_BUDGET"]
+        assert "issued 3 SQL queries (budget 2)" in log.output[0]
+        assert "3x SELECT" in log.output[0]
+        assert REGISTRY.get_sample_value(
+            "c3bottles_request_db_queries_count",
+            {"method": "GET", "endpoint": "view.list_"}
+        ) >= 1
+
+    def test_streamed_queries_are_counted(self):
+        labels = {"method": "GET", "endpoint": "api.all_dp"}
+
+        def sample(name):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        DropPoint(1, lat=0, lng=0, level=0)
+        db.session.commit()
+        app.before_request(before_request)
+        app.after_request(after_request)
+        try:
+            count = sample("c3bottles_request_db_queries_count")
+            queries = sample("c3bottles_request_db_queries_sum")
+            res = self.c3bottles.get("/api/all_dp.json", buffered=False)
+            assert sample("c3bottles_request_db_queries_count") == count
+            res.get_data()
+            res.close()
+        finally:
+            app.before_request_funcs[None].remove(before_request)
+            app.after_request_funcs[None].remove(after_request)
+        assert sample("c3bottles_request_db_queries_count") == count + 1
+        assert sample("c3bottles_request_db_queries_sum") > queries
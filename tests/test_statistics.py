@@ -0,0 +1,57 @@
+from c3bottles import db
+from c3bottles.lib.statistics import stats_obj
+from c3bottles.model.drop_point import DropPoint
+from c3bottles.model.hourly_count import HourlyCount
+from c3bottles.model.report import Report
+from c3bottles.model.visit import Visit
+
+from . import C3BottlesTestCase
+
+
+class StatisticsTestCase(C3BottlesTestCase):
+
+    def setUp(self):
+        super().setUp()
+        dps = [DropPoint(i, lat=0, lng=0, level=0) for i in range(1, 5)]
+        dps[0].report(state=Report.states[5])
+        dps[1].report(state=Report.states[5])
+        dps[1].report(state=Report.states[6])
+        dps[2].visit(action=Visit.actions[0])
+        dps[3].remove()
+        db.session.commit()
+
+    def test_counts(self):
+        assert stats_obj.drop_point_count == 3
+        assert stats_obj.report_count == 3
+        assert stats_obj.visit_count == 1
+
+    def test_drop_points_by_state(self):
+        by_state = stats_obj.drop_points_by_state
+        assert set(by_state.keys()) == set(Report.states)
+        assert by_state[Report.states[5]] == 1
+        assert by_state[Report.states[6]] == 1
+        assert by_state[Report.states[-1]] == 1
+        assert by_state[Report.states[1]] == 0
+
+    def test_reports_by_state(self):
+        assert stats_obj.reports_by_state[Report.states[5]] == 2
+        assert stats_obj.reports_by_state[Report.states[0]] == 0
+
+    def test_visits_by_action(self):
+        by_action = stats_obj.visits_by_action
+        assert set(by_action.keys()) == set(Visit.actions)
+        assert by_action[Visit.actions[0]] == 1
+        assert sum(by_action.values()) == 1
+
+    def test_counts_from_hourly_counts(self):
+        rows = HourlyCount.query.filter_by(kind="report").count()
+        HourlyCount.query.filter_by(kind="report").update(
+            {HourlyCount.count: HourlyCount.count + 10}, synchronize_session=False
+        )
+        db.session.commit()
+        assert stats_obj.report_count == 3 + 10 * rows
+        assert stats_obj.visit_count == 1
+
+    def test_numbers_json(self):
+        res = self.c3bottles.get("/numbers.json")
+        assert res.status_code == 200
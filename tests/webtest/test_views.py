@@ -47,3 +47,18 @@ def test_admin_area_401_always(fresh_state):
         res = testapp.get(url_for("admin.index") + "/nonexistant", expect_errors=True)
     assert res.status_int == 401
     assert "Unauthorized" in res
+
+
+def test_page_js(fresh_state):
+    with app.test_request_context():
+        url = url_for("view.list_js", lang="de")
+    res = testapp.get(url)
+    assert res.content_type == "application/javascript"
+    assert "public" in res.headers["Cache-Control"]
+    assert "Set-Cookie" not in res.headers
+    assert "/api/drop_points/de.json" in res
+    res = testapp.get(url, headers={"If-None-Match": res.headers["ETag"]})
+    assert res.status_int == 304
+    with app.test_request_context():
+        res = testapp.get(url_for("view.list_js", lang="xx"), expect_errors=True)
+    assert res.status_int == 404